@@ -0,0 +1,151 @@
+# Compaction of MCP responses before they are interpolated into the summarization prompt
+# Records become a column header plus value rows, Salesforce `attributes` blobs are stripped, columns
+# with a single value are hoisted out, duplicate rows are merged, large record sets get pre-computed
+# aggregates, and the result is truncated to a token budget.
+import os
+import json
+from collections import Counter
+
+COMPACTION_TOKEN_BUDGET = int(os.getenv("COMPACTION_TOKEN_BUDGET", "4000"))
+# Record sets larger than this also get per-column aggregates (counts, top values, numeric ranges)
+COMPACTION_AGGREGATE_THRESHOLD = int(os.getenv("COMPACTION_AGGREGATE_THRESHOLD", "50"))
+COMPACTION_TOP_VALUES = 5
+
+
+# Rough token estimate (about 4 characters per token for English text and JSON)
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+# Flatten a record: drop `attributes`, turn relationship objects into dotted columns (Owner.Name)
+# and child subqueries into lists of flattened records
+def _flatten(record: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in record.items():
+        if key == "attributes":
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict) and "records" in value:
+            flat[name] = [_flatten(r) for r in value.get("records") or []]
+        elif isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def _aggregate(columns: list, rows: list) -> dict:
+    aggregates = {"count": len(rows), "columns": {}}
+    for i, column in enumerate(columns):
+        values = [row[i] for row in rows if row[i] is not None and not isinstance(row[i], list)]
+        if not values:
+            continue
+        if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            aggregates["columns"][column] = {
+                "min": min(values), "max": max(values), "sum": sum(values), "avg": sum(values) / len(values)
+            }
+            continue
+        counts = Counter(_dumps(v) if isinstance(v, (dict, list)) else v for v in values)
+        summary = {"distinct": len(counts)}
+        # Group summaries only make sense for low-cardinality columns (status, type, owner...)
+        if len(counts) < len(values):
+            summary["top"] = [[value, count] for value, count in counts.most_common(COMPACTION_TOP_VALUES)]
+        aggregates["columns"][column] = summary
+    return aggregates
+
+
+# Turn a list of records (dicts) into {"columns", "rows"} plus constants, duplicates and aggregates
+def compact_records(records: list) -> dict:
+    flat = [_flatten(r) if isinstance(r, dict) else {"value": r} for r in records]
+    columns = list(dict.fromkeys(key for record in flat for key in record))
+    table = {"count": len(flat)}
+    # Hoist columns that hold the same value in every record
+    if len(flat) > 1:
+        constants = {}
+        for column in columns:
+            first = _dumps(flat[0].get(column))
+            if all(_dumps(record.get(column)) == first for record in flat[1:]):
+                constants[column] = flat[0].get(column)
+        if constants:
+            table["constants"] = constants
+            columns = [c for c in columns if c not in constants]
+    rows = [[record.get(c) for c in columns] for record in flat]
+    if len(flat) > COMPACTION_AGGREGATE_THRESHOLD:
+        table["aggregates"] = _aggregate(columns, rows)
+    # Merge identical rows, keeping a count per distinct row
+    counts = Counter(_dumps(row) for row in rows)
+    if len(counts) < len(rows):
+        unique = {}
+        for row in rows:
+            unique.setdefault(_dumps(row), row)
+        rows = [row + [counts[key]] for key, row in unique.items()]
+        columns = columns + ["_count"]
+    table["columns"] = columns
+    table["rows"] = rows
+    return table
+
+
+# Drop trailing rows (or list items) until the payload fits the budget
+def _truncate(payload: dict, key: str, budget: int) -> dict:
+    container = payload["result"]
+    items = container[key]["rows"] if isinstance(container[key], dict) else container[key]
+    total = len(items)
+    low, high = 0, total
+    while low < high:
+        mid = (low + high + 1) // 2
+        candidate = items[:mid]
+        truncated = {"shown": mid, "total": total}
+        if isinstance(container[key], dict):
+            trial = {**payload, "result": {**container, key: {**container[key], "rows": candidate}, "truncated": truncated}}
+        else:
+            trial = {**payload, "result": {**container, key: candidate, "truncated": truncated}}
+        if estimate_tokens(_dumps(trial)) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    if isinstance(container[key], dict):
+        container[key]["rows"] = items[:low]
+    else:
+        container[key] = items[:low]
+    container["truncated"] = {"shown": low, "total": total}
+    return payload
+
+
+# Columnar records as the MCP server sends them: exactly {"columns", "rows"}. Tables built by
+# compact_records (e.g. session results passed through again) also carry count/constants/aggregates
+# and are left as they are.
+def _is_columnar(value) -> bool:
+    return (isinstance(value, dict) and set(value) == {"columns", "rows"}
+            and isinstance(value["columns"], list) and isinstance(value["rows"], list))
+
+
+# Compact a JSON-RPC MCP response for the summarization prompt.
+# Returns (compacted JSON string, stats with the estimated tokens before/after/saved).
+def compact_response(response, token_budget: int = COMPACTION_TOKEN_BUDGET):
+    tokens_before = estimate_tokens(str(response))
+    payload = response
+    if isinstance(response, dict) and isinstance(response.get("result"), dict):
+        result = {k: v for k, v in response["result"].items() if k != "status"}
+        for key in ("records", "fields"):
+            if _is_columnar(result.get(key)):
+                # Columnar records from the MCP server: back to one dict per record for flattening
+                result[key] = [dict(zip(result[key]["columns"], row)) for row in result[key]["rows"]]
+            if isinstance(result.get(key), list):
+                result[key] = compact_records(result[key])
+        payload = {"result": result}
+        if estimate_tokens(_dumps(payload)) > token_budget:
+            for key in ("records", "fields", "objects"):
+                if key in result:
+                    payload = _truncate(payload, key, token_budget)
+                    break
+    compacted = _dumps(payload)
+    tokens_after = estimate_tokens(compacted)
+    return compacted, {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": max(tokens_before - tokens_after, 0),
+    }
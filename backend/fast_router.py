@@ -0,0 +1,309 @@
+# Local fast path in front of the Gemini router
+# Obvious requests ("list objects", "describe Account", "fields of opportunity line items") are routed
+# without a Gemini call: keyword rules pick the intent, object names are matched against the org's
+# sObject list (exact, plural, spacing and fuzzy matches), and an optional naive Bayes classifier
+# trained on labelled prompts can confirm the rules or route prompts they do not cover. Anything
+# ambiguous falls through to the LLM. A sample of fast-path decisions is re-routed by the LLM in the
+# background to measure how often both agree.
+import os
+import re
+import json
+import math
+import random
+import asyncio
+import difflib
+import logging
+from collections import Counter, defaultdict
+from common.cache import TTLCache
+from mcp_client import mcp_client
+from common.tracing import metrics
+
+logger = logging.getLogger("fast_router")
+
+FAST_ROUTER = os.getenv("FAST_ROUTER", "true").lower() in ("1", "true", "yes")
+# Minimum confidence for routing without Gemini
+FAST_ROUTER_THRESHOLD = float(os.getenv("FAST_ROUTER_THRESHOLD", "0.8"))
+# Fraction of fast-path decisions also routed by the LLM in the background to measure accuracy (0 disables)
+FAST_ROUTER_SHADOW_RATE = float(os.getenv("FAST_ROUTER_SHADOW_RATE", "0.1"))
+# Optional JSONL file of {"prompt": ..., "tool": ...} examples to train the local classifier on
+FAST_ROUTER_CLASSIFIER = os.getenv("FAST_ROUTER_CLASSIFIER")
+# The sObject list used for name matching is fetched from the MCP server and kept this long (seconds)
+FAST_ROUTER_OBJECTS_TTL = float(os.getenv("FAST_ROUTER_OBJECTS_TTL", "600"))
+# Lowest similarity accepted for a fuzzy object name match
+FAST_ROUTER_FUZZY_CUTOFF = 0.85
+FAST_ROUTER_MAX_OBJECTS = 5
+
+# Keyword rules per intent. A prompt matching the rules of more than one intent is left to the LLM,
+# so "describe Account and show its records" is never cut down to a describe.
+INTENT_RULES = {
+    "list_salesforce_objects": [
+        r"\b(list|show|display|get|give|what|which|enumerate)\b.*\b(s?objects|entities|tables)\b",
+        r"\b(all|available|accessible|existing)\s+(the\s+)?(salesforce\s+)?(s?objects|entities)\b",
+    ],
+    "describe_salesforce_object": [
+        r"\bdescribe\b",
+        r"\b(fields?|columns?|schema|structure|metadata|attributes|picklists?)\b",
+    ],
+    "query_salesforce_records": [
+        r"\b(records?|rows?|how\s+many|count|number\s+of|top\s+\d+|latest|recent|last\s+\d+|created|modified)\b",
+        r"\b(where|whose|owned|sum|total|average|avg|max|min|sorted|order(ed)?\s+by|grouped)\b",
+    ],
+    "export_salesforce_records": [
+        r"\b(export|download|extract|dump|csv|parquet|bulk)\b",
+    ],
+}
+# Intents the fast path resolves on its own; other intents need SOQL, which only the LLM can write
+FAST_INTENTS = ("list_salesforce_objects", "describe_salesforce_object")
+RULE_CONFIDENCE = 0.9
+# Describe requests phrased explicitly enough to skip the LLM. A bare "field" or "columns" ("the Industry
+# field for Acme") is as often a question about records, so on its own it scores WEAK_RULE_CONFIDENCE,
+# below the threshold.
+DESCRIBE_PHRASES = [
+    r"\bdescribe\b",
+    r"\bwhat\s+(fields|columns|attributes|picklists?)\s+(does|do|are|exist|is)\b",
+    r"\b(list|show|get|give)\s+(me\s+)?(all\s+)?(of\s+)?(the\s+)?(available\s+)?(fields|columns|attributes|picklists|schema|structure|metadata)\s+(available\s+)?(of|for|on|in)\b",
+    r"\b(schema|structure|metadata)\s+(of|for)\b",
+    r"^\W*(fields|columns)\s+(of|on|in)\b",
+]
+WEAK_RULE_CONFIDENCE = 0.6
+# Cues that a prompt asks about records rather than the schema: filters, values, record numbers and IDs
+RECORD_CUES = re.compile(
+    r"\b(which|where|whose|set\s+to|equals?|empty|blank|null|missing|contains?|value\s+of)\b|\b\d+\b"
+    r"|\b(?=[A-Za-z0-9]*\d)[A-Za-z0-9]{15}(?:[A-Za-z0-9]{3})?\b",
+    re.IGNORECASE,
+)
+# Words that never name an object, even when an org has an object with a similar name
+STOPWORDS = {
+    "a", "all", "an", "and", "any", "are", "about", "describe", "details", "do", "does", "for", "from", "get",
+    "give", "have", "has", "in", "info", "information", "is", "it", "its", "list", "me", "metadata", "my",
+    "object", "objects", "of", "on", "org", "please", "salesforce", "schema", "sobject", "sobjects", "show",
+    "structure", "tell", "the", "this", "what", "which", "field", "fields", "column", "columns", "attributes",
+    "picklist", "picklists", "available", "there", "table", "entity", "to", "with", "you", "can", "i", "we",
+    # Common field words that are also standard sObject names (Name, Type, ...)
+    "name", "names", "type", "types", "id", "ids", "label", "labels", "value", "values", "status",
+}
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9_]*")
+# What may stand between two objects of one request: "Account, Contact and the Opportunity". A
+# connector is required, so adjacent names ("account address fields") are not two objects.
+_OBJECT_SEPARATOR = re.compile(r"^(?:[\s,&/]|\band\b|\bor\b|\bplus\b|\bthe\b)*$", re.IGNORECASE)
+_OBJECT_CONNECTOR = re.compile(r"[,&/]|\b(?:and|or|plus)\b", re.IGNORECASE)
+
+objects_cache = TTLCache("fast_router_objects", max_size=1, ttl=FAST_ROUTER_OBJECTS_TTL)
+
+
+# Multinomial naive Bayes over word unigrams and bigrams: small, local and quick to train
+class NaiveBayes:
+    def __init__(self, examples: list):
+        self.word_counts = defaultdict(Counter)
+        self.label_counts = Counter()
+        for prompt, label in examples:
+            self.label_counts[label] += 1
+            self.word_counts[label].update(self.features(prompt))
+        self.vocabulary = {word for counts in self.word_counts.values() for word in counts}
+        self.totals = {label: sum(counts.values()) for label, counts in self.word_counts.items()}
+
+    @staticmethod
+    def features(prompt: str) -> list:
+        words = [word.lower() for word in _WORD.findall(prompt)]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    # (label, probability) of the most likely label
+    def predict(self, prompt: str):
+        if not self.label_counts:
+            return None, 0.0
+        features = self.features(prompt)
+        examples = sum(self.label_counts.values())
+        scores = {}
+        for label, count in self.label_counts.items():
+            denominator = self.totals[label] + len(self.vocabulary)
+            scores[label] = math.log(count / examples) + sum(
+                math.log((self.word_counts[label][word] + 1) / denominator) for word in features if word in self.vocabulary
+            )
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / norm
+
+
+def load_classifier(path: str):
+    if not path:
+        return None
+    with open(path) as f:
+        examples = [json.loads(line) for line in f if line.strip()]
+    classifier = NaiveBayes([(example["prompt"], example["tool"]) for example in examples])
+    logger.info("Fast router classifier trained on %s examples from %s", len(examples), path)
+    return classifier
+
+
+classifier = load_classifier(FAST_ROUTER_CLASSIFIER)
+
+
+# Intents whose keyword rules match the prompt
+def rule_intents(prompt: str) -> list:
+    text = prompt.lower()
+    return [intent for intent, rules in INTENT_RULES.items() if any(re.search(rule, text) for rule in rules)]
+
+
+# Confidence of an intent picked by the keyword rules
+def rule_confidence(intent: str, prompt: str) -> float:
+    if intent == "describe_salesforce_object":
+        text = prompt.lower()
+        return RULE_CONFIDENCE if any(re.search(phrase, text) for phrase in DESCRIBE_PHRASES) else WEAK_RULE_CONFIDENCE
+    return RULE_CONFIDENCE
+
+
+# Lookup forms of an object name: lower case, without the custom object suffix and separators
+def _object_forms(name: str) -> set:
+    lower = name.lower()
+    base = re.sub(r"__(c|mdt|e|x|b)$", "", lower)
+    return {lower, base, base.replace("_", "")}
+
+
+# Singular candidates of a word or phrase ("opportunities" -> "opportunity")
+def _singulars(word: str) -> list:
+    forms = [word]
+    if word.endswith("ies"):
+        forms.append(word[:-3] + "y")
+    if word.endswith("es"):
+        forms.append(word[:-2])
+    if word.endswith("s"):
+        forms.append(word[:-1])
+    return forms
+
+
+# sObject names mentioned in the prompt as (name, score, start, end): a match score (1.0 for exact
+# matches) and the character span of the first mention, in prompt order. Phrases of up to three words
+# are joined ("opportunity line item" -> OpportunityLineItem); longer exact matches win.
+def match_objects(prompt: str, objects: list) -> list:
+    index = {}
+    for name in objects:
+        for form in _object_forms(name):
+            index.setdefault(form, name)
+    forms = list(index)
+    spans = [match.span() for match in _WORD.finditer(prompt)]
+    words = [prompt[start:end] for start, end in spans]
+    scores, positions, used = {}, {}, set()
+    for size in (3, 2, 1):
+        for start in range(len(words) - size + 1):
+            span = set(range(start, start + size))
+            phrase = [word.lower() for word in words[start:start + size]]
+            if span & used or phrase[0] in STOPWORDS or phrase[-1] in STOPWORDS:
+                continue
+            joined = "".join(phrase)
+            name = next((index[form] for form in _singulars(joined) if form in index), None)
+            score = 1.0
+            if name is None and size == 1 and len(joined) > 3:
+                close = difflib.get_close_matches(joined, forms, n=1, cutoff=FAST_ROUTER_FUZZY_CUTOFF)
+                if close:
+                    name, score = index[close[0]], difflib.SequenceMatcher(None, joined, close[0]).ratio()
+            if name is not None:
+                used |= span
+                position = (spans[start][0], spans[start + size - 1][1])
+                scores[name] = max(score, scores.get(name, 0.0))
+                positions[name] = min(positions.get(name, position), position)
+    return sorted(((name, scores[name], *positions[name]) for name in scores), key=lambda match: match[2])
+
+
+# Several objects are only taken as one request when they are listed together ("Account and Contact");
+# an object named elsewhere in the prompt ("... I want to create a Task") is left to the LLM
+def listed_together(prompt: str, matched: list) -> bool:
+    between = [prompt[previous[3]:current[2]] for previous, current in zip(matched, matched[1:])]
+    return all(_OBJECT_SEPARATOR.match(text) and _OBJECT_CONNECTOR.search(text) for text in between)
+
+
+# The org's sObject names, from the MCP server (cached; None when they cannot be fetched)
+async def salesforce_objects():
+    objects = await objects_cache.aget("all")
+    if objects is not None:
+        return objects
+    try:
+        data = await mcp_client.call_tool("list_salesforce_objects", {})
+        objects = (data.get("result") or {}).get("objects") or []
+    except Exception as e:
+        logger.warning("Fast router could not fetch the sObject list: %s", e)
+        return None
+    if objects:
+        await objects_cache.aset("all", objects)
+    return objects
+
+
+# Route a prompt locally. Returns (plan, confidence, reason) where plan is a list of
+# {"tool", "arguments"} steps, or None when the prompt should go to the LLM.
+async def fast_route(prompt: str):
+    intents = rule_intents(prompt)
+    intent, confidence, reason = (intents[0], rule_confidence(intents[0], prompt), "rules") if len(intents) == 1 else (None, 0.0, "ambiguous" if intents else "no_rule")
+    if classifier is not None:
+        label, probability = classifier.predict(prompt)
+        if intent is None and not intents:
+            intent, confidence, reason = label, probability, "classifier"
+        elif label == intent:
+            confidence, reason = max(confidence, probability), "rules+classifier"
+        elif intent is not None:
+            # Rules and classifier disagree
+            return None, 0.0, "disagreement"
+    if intent == "describe_salesforce_object" and RECORD_CUES.search(prompt):
+        return None, 0.0, "record_cue"
+    if intent not in FAST_INTENTS or confidence < FAST_ROUTER_THRESHOLD:
+        return None, confidence, reason if intent is None else f"{reason}:{intent}"
+    objects = await salesforce_objects()
+    if objects is None:
+        return None, 0.0, "no_objects"
+    matched = match_objects(prompt, objects)
+    if intent == "list_salesforce_objects":
+        # "list objects" mentioning a specific object is probably about that object
+        return (None, 0.0, "object_mentioned") if matched else ([{"tool": intent, "arguments": {}}], confidence, reason)
+    if not matched or len(matched) > FAST_ROUTER_MAX_OBJECTS:
+        return None, 0.0, "no_object" if not matched else "too_many_objects"
+    if not listed_together(prompt, matched):
+        return None, 0.0, "scattered_objects"
+    confidence *= min(score for _, score, _, _ in matched)
+    if confidence < FAST_ROUTER_THRESHOLD:
+        return None, confidence, "fuzzy_object"
+    return [{"tool": intent, "arguments": {"object_name": name}} for name, _, _, _ in matched], confidence, reason
+
+
+# Tools and lower-cased object names of a plan, for comparing the fast path with the LLM
+def plan_signature(plan: list) -> set:
+    return {(step["tool"], ((step.get("arguments") or {}).get("object_name") or "").lower()) for step in plan}
+
+
+_shadow_tasks = set()
+
+
+# Compare a fast-path plan with what the LLM router decides (in the background, on a sample)
+def shadow_check(prompt: str, plan: list, llm_route):
+    if FAST_ROUTER_SHADOW_RATE <= 0 or random.random() >= FAST_ROUTER_SHADOW_RATE:
+        return
+    async def check():
+        try:
+            llm_plan = await llm_route()
+        except Exception as e:
+            logger.warning("Fast router shadow check failed: %s", e)
+            metrics.inc("fast_router_shadow_total", {"result": "error"})
+            return
+        agree = plan_signature(plan) == plan_signature(llm_plan)
+        if not agree:
+            logger.info("Fast router disagreed with the LLM on %r: %s vs %s", prompt, plan, llm_plan)
+        metrics.inc("fast_router_shadow_total", {"result": "agree" if agree else "disagree"},
+                    help="Fast-path decisions re-routed by the LLM, by whether both agreed")
+    task = asyncio.create_task(check())
+    _shadow_tasks.add(task)
+    task.add_done_callback(_shadow_tasks.discard)
+
+
+# Fast-path rate and measured accuracy, from the counters on /metrics
+def router_stats() -> dict:
+    paths = metrics.counter_totals("fast_router_decisions_total", "path")
+    shadow = metrics.counter_totals("fast_router_shadow_total", "result")
+    decisions = sum(paths.values())
+    checked = shadow.get("agree", 0) + shadow.get("disagree", 0)
+    return {
+        "enabled": FAST_ROUTER,
+        "classifier": classifier is not None,
+        "threshold": FAST_ROUTER_THRESHOLD,
+        "decisions": decisions,
+        "fast_path": paths.get("fast", 0),
+        "fast_path_rate": paths.get("fast", 0) / decisions if decisions else 0.0,
+        "shadow_checks": checked,
+        "shadow_errors": shadow.get("error", 0),
+        "accuracy": shadow.get("agree", 0) / checked if checked else None,
+    }
@@ -1,22 +1,111 @@
 import os
-import google.generativeai as genai
-import requests
 import re
+import json
+import time
+import asyncio
+import logging
+from mcp_client import mcp_client
+from prompt_cache import cached_prompt
+from common.tracing import metrics, current_trace_id, SIZE_BUCKETS
+
+logger = logging.getLogger("gemini_llm")
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MODEL_NAME = "models/gemini-2.5-flash-lite-preview-06-17"
-MCP_TOOLS = "http://localhost:8010/tools"
+# Routing mode: "structured" picks the tool and its arguments in a single function-calling request,
+# "multi" keeps the original flow (ask_gemini for the route, then an extract_* call for the arguments)
+ROUTING_MODE = os.getenv("ROUTING_MODE", "structured").lower()
+# Upper bound on the tool calls of one plan (they run as parallel graph branches)
+MAX_PLAN_STEPS = int(os.getenv("MAX_PLAN_STEPS", "5"))
+
+_genai = None
+_models = {}  # function declarations (JSON, "" for none) -> GenerativeModel
+_models_loop = None
+
+# google.generativeai takes a few hundred milliseconds to import, so it is imported and configured on
+# first use (or by the startup warmup) instead of when this module is loaded
+def genai():
+    global _genai
+    if _genai is None:
+        import google.generativeai as module
+        module.configure(api_key=GEMINI_API_KEY)
+        _genai = module
+    return _genai
+
+# Reusable model objects, one per set of function declarations. Their async clients belong to the
+# event loop that first used them, so a new loop (e.g. a test client) gets new models.
+def get_model(declarations: list = None):
+    global _models_loop
+    loop = asyncio.get_running_loop()
+    if _models_loop is not loop:
+        _models.clear()
+        _models_loop = loop
+    key = json.dumps(declarations, sort_keys=True) if declarations else ""
+    model = _models.get(key)
+    if model is None:
+        options = {"tools": [{"function_declarations": declarations}]} if declarations else {}
+        model = _models[key] = genai().GenerativeModel(MODEL_NAME, **options)
+    return model
+
+# Startup warmup: import the SDK off the event loop and create the plain model, so the first chat
+# does not pay for them
+async def warm_up():
+    await asyncio.to_thread(genai)
+    get_model()
+
+# Record wall time, prompt size and token usage of one Gemini call under gemini_*{kind=...}
+def _record_gemini_call(kind: str, prompt: str, started: float, status: str, usage=None):
+    elapsed = time.perf_counter() - started
+    labels = {"kind": kind}
+    metrics.observe("gemini_request_duration_seconds", {**labels, "status": status}, elapsed,
+                    help="Wall time of each Gemini request")
+    metrics.observe("gemini_prompt_bytes", labels, len(prompt.encode()), buckets=SIZE_BUCKETS,
+                    help="Size of each Gemini prompt")
+    if usage is not None:
+        metrics.inc("gemini_tokens_total", {**labels, "type": "prompt"}, getattr(usage, "prompt_token_count", 0) or 0,
+                    help="Gemini tokens used")
+        metrics.inc("gemini_tokens_total", {**labels, "type": "completion"}, getattr(usage, "candidates_token_count", 0) or 0)
+    logger.info("trace=%s gemini=%s status=%s duration_ms=%.1f", current_trace_id(), kind, status, elapsed * 1000)
+
+# Run a (non-streaming) Gemini request with tracing
+async def _generate(kind: str, model, prompt: str):
+    started = time.perf_counter()
+    status, usage = "error", None
+    try:
+        response = await model.generate_content_async(prompt)
+        status, usage = "ok", getattr(response, "usage_metadata", None)
+        logger.debug("[Gemini %s raw] %s", kind, response)
+        return response
+    finally:
+        _record_gemini_call(kind, prompt, started, status, usage)
+
+# Extract the text of a Gemini response, whatever shape it comes back in
+def _response_text(response) -> str:
+    if hasattr(response, 'text'):
+        return response.text.strip()
+    elif hasattr(response, 'candidates') and response.candidates:
+        return response.candidates[0].text.strip()
+    return str(response)
 
-genai.configure(api_key=GEMINI_API_KEY)
+def clean_soql(soql: str) -> str:
+    # Remove leading 'sql\n' or 'soql\n' (case-insensitive)
+    soql = re.sub(r'^(sql|soql)\s*\n', '', soql, flags=re.IGNORECASE)
+    # Clean SOQL: allow only letters, numbers, spaces, and SOQL symbols
+    soql = re.sub(r"[^a-zA-Z0-9 \n\t\(\)\,\.\*\=\>\<\%\_\'\"-]", "", soql)
+    return soql.strip()
+
+def clean_objectname(object_name: str) -> str:
+    # Clean object name: allow only letters, numbers, spaces, and SOQL symbols
+    object_name = re.sub(r"[^a-zA-Z0-9 \n\t\(\)\,\.\*\=\>\<\%\_\'\"-]", "", object_name)
+    return object_name.strip()
 
-def ask_gemini(prompt: str) -> str:
+@cached_prompt("route", should_cache=lambda tool_name: tool_name != "failback")
+async def ask_gemini(prompt: str) -> str:
     # Fetch MCP tools
     try:
-        resp = requests.get(MCP_TOOLS)
-        resp.raise_for_status()
-        tools = resp.json().get("result", {}).get("tools", [])
+        tools = await mcp_client.list_tools()
     except Exception as e:
-        print(f"[Gemini] Failed to fetch MCP tools: {e}")
+        logger.warning("[Gemini] Failed to fetch MCP tools: %s", e)
         tools = []
     if not tools:
         return "failback"
@@ -31,67 +120,147 @@ def ask_gemini(prompt: str) -> str:
         f"Available tools:\n{tool_list}\n"
         "Respond with only the tool name (e.g., 'list_salesforce_objects') or 'failback'."
     )
-    response = genai.GenerativeModel(MODEL_NAME).generate_content(llm_prompt)
-    print("[Gemini tool match raw]", response)
-    if hasattr(response, 'text'):
-        tool_name = response.text.strip().split()[0]  # Only first word, in case LLM adds extra
-    elif hasattr(response, 'candidates') and response.candidates:
-        tool_name = response.candidates[0].text.strip().split()[0]
-    else:
+    response = await _generate("route", get_model(), llm_prompt)
+    text = _response_text(response)
+    if not text:
         return "failback"
+    tool_name = text.split()[0]  # Only first word, in case LLM adds extra
     # Validate tool name
     if tool_name in tool_names:
-        print("returned tool: " + tool_name)
+        logger.info("returned tool: %s", tool_name)
         return tool_name
     return "failback"
 
-def ask_gemini_final(prompt: object) -> str:
+# Build Gemini function declarations from the MCP tool JSON schemas
+def _function_declarations(tools: list) -> list:
+    declarations = []
+    for tool in tools:
+        declaration = {"name": tool["name"], "description": tool["description"]}
+        parameters = tool.get("parameters") or {}
+        # Gemini rejects object schemas without properties, so parameterless tools omit them. Its schema
+        # subset has no anyOf either; those alternatives are checked in _validate_arguments instead.
+        if parameters.get("properties"):
+            declaration["parameters"] = {key: value for key, value in parameters.items() if key != "anyOf"}
+        declarations.append(declaration)
+    return declarations
+
+def _has_arguments(arguments: dict, names: list) -> bool:
+    return all(arguments.get(name) not in (None, "") for name in names)
+
+# Check function-call arguments against the tool schema; returns None when they are unusable
+def _validate_arguments(tool: dict, args: dict):
+    schema = tool.get("parameters") or {}
+    properties = schema.get("properties", {})
+    arguments = {}
+    for name, value in args.items():
+        if name not in properties:
+            continue
+        if properties[name].get("type") == "string":
+            if not isinstance(value, str):
+                return None
+            value = value.strip()
+        elif properties[name].get("type") == "integer":
+            # Gemini returns every number as a float
+            if not isinstance(value, (int, float)):
+                return None
+            value = int(value)
+        arguments[name] = value
+    if not _has_arguments(arguments, schema.get("required", [])):
+        return None
+    # e.g. a query tool call needs either a query or a page token
+    alternatives = schema.get("anyOf")
+    if alternatives and not any(_has_arguments(arguments, alternative.get("required", [])) for alternative in alternatives):
+        return None
+    # Apply the same cleanup as the dedicated extraction helpers
+    if "query" in arguments:
+        arguments["query"] = clean_soql(arguments["query"])
+    if "object_name" in arguments:
+        arguments["object_name"] = clean_objectname(arguments["object_name"])
+    return arguments
+
+# Route the prompt and extract the tool arguments in one function-calling round trip.
+# `context` lists the earlier turns of a chat session, so follow-up questions can be planned.
+# Returns a plan: a list of (tool_name, arguments) with one entry per function call, which the graph
+# runs as parallel branches. An empty plan means failback; arguments are None when the model's
+# arguments failed validation, in which case the tool node falls back to the dedicated extract_* helper.
+@cached_prompt("structured", should_cache=bool)
+async def plan_tool_calls(prompt: str, context: str = "") -> list:
+    tools = await mcp_client.list_tools()
+    if not tools:
+        return []
+    llm_prompt = (
+        "Decide which of the available functions are needed to resolve the following Salesforce user request "
+        "and call them with their arguments. If the request needs several tools or several objects (for example "
+        "the fields of an object and some of its records), call every function you need in parallel. "
+        "SOQL queries must be plain SOQL without decorators. "
+        "If no function is suitable, answer with the single word failback.\n"
+        + (f"Earlier in this conversation (resolve references such as 'it' or 'those' with it):\n{context}\n" if context else "")
+        + f"User request: {prompt}"
+    )
+    model = get_model(_function_declarations(tools))
+    response = await _generate("structured_route", model, llm_prompt)
+    tools_by_name = {tool["name"]: tool for tool in tools}
+    plan = []
+    for candidate in (response.candidates or [])[:1]:
+        for part in candidate.content.parts:
+            function_call = getattr(part, "function_call", None)
+            if not function_call or function_call.name not in tools_by_name:
+                continue
+            arguments = _validate_arguments(tools_by_name[function_call.name], dict(function_call.args or {}))
+            step = (function_call.name, arguments)
+            if step not in plan:
+                plan.append(step)
+    plan = plan[:MAX_PLAN_STEPS]
+    logger.info("returned plan: %s", plan)
+    return plan
+
+@cached_prompt("final")
+async def ask_gemini_final(prompt: object, on_token=None) -> str:
     final_prompt = (
         "Please read the following JSON response and provide a natural language summary of its contents. "
         "Make the summary as clear and human-friendly as possible. If the response include a query please maintain it\n"
         f"JSON:\n{prompt}"
     )
-    response = genai.GenerativeModel(MODEL_NAME).generate_content(final_prompt)
-    print("[Gemini SOQL raw]", response)
-    if hasattr(response, 'text'):
-        return response.text.strip()
-    elif hasattr(response, 'candidates') and response.candidates:
-        return response.candidates[0].text.strip()
-    else:
-        return str(response) 
+    model = get_model()
+    if on_token is None:
+        response = await _generate("final", model, final_prompt)
+        return _response_text(response)
+    # Streaming: hand every chunk to on_token as soon as Gemini produces it
+    chunks = []
+    started = time.perf_counter()
+    status, usage = "error", None
+    try:
+        response = await model.generate_content_async(final_prompt, stream=True)
+        async for chunk in response:
+            # Token usage is reported on the last chunk
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. the closing chunk with the finish reason)
+                continue
+            if text:
+                chunks.append(text)
+                on_token(text)
+        status = "ok"
+    finally:
+        _record_gemini_call("final", final_prompt, started, status, usage)
+    return "".join(chunks).strip()
 
-def extract_soql_from_prompt(prompt: str) -> str:
+@cached_prompt("soql", should_cache=bool)
+async def extract_soql_from_prompt(prompt: str) -> str:
     soql_prompt = (
         "Convert the following user request into a Salesforce SOQL query. "
         "Only return the SOQL query, nothing else. Remove all decorators\nRequest: " + prompt
     )
-    response = genai.GenerativeModel(MODEL_NAME).generate_content(soql_prompt)
-    print("[Gemini SOQL raw]", response)
-    if hasattr(response, 'text'):
-        soql = response.text.strip()
-    elif hasattr(response, 'candidates') and response.candidates:
-        soql = response.candidates[0].text.strip()
-    else:
-        soql = str(response)
-    # Remove leading 'sql\n' or 'soql\n' (case-insensitive)
-    soql = re.sub(r'^(sql|soql)\s*\n', '', soql, flags=re.IGNORECASE)
-    # Clean SOQL: allow only letters, numbers, spaces, and SOQL symbols
-    soql = re.sub(r"[^a-zA-Z0-9 \n\t\(\)\,\.\*\=\>\<\%\_\'\"-]", "", soql)
-    return soql.strip()
+    response = await _generate("soql", get_model(), soql_prompt)
+    return clean_soql(_response_text(response))
 
-def extract_objectname_from_prompt(prompt: str) -> str:
+@cached_prompt("objectname", should_cache=bool)
+async def extract_objectname_from_prompt(prompt: str) -> str:
     soql_prompt = (
         "Get from the following user request the Salesforce object that the user wants to know de details. "
         "Only return the Object Name, nothing else.\nRequest: " + prompt
     )
-    response = genai.GenerativeModel(MODEL_NAME).generate_content(soql_prompt)
-    print("[Gemini SOQL raw]", response)
-    if hasattr(response, 'text'):
-        soql = response.text.strip()
-    elif hasattr(response, 'candidates') and response.candidates:
-        soql = response.candidates[0].text.strip()
-    else:
-        soql = str(response)
-    # Clean SOQL: allow only letters, numbers, spaces, and SOQL symbols
-    soql = re.sub(r"[^a-zA-Z0-9 \n\t\(\)\,\.\*\=\>\<\%\_\'\"-]", "", soql)
-    return soql.strip() 
\ No newline at end of file
+    response = await _generate("objectname", get_model(), soql_prompt)
+    return clean_objectname(_response_text(response))
@@ -1,211 +1,367 @@
 # Imports and dependencies
-from typing import TypedDict
-from langgraph.graph import StateGraph, END
-from gemini_llm import ask_gemini, extract_soql_from_prompt, ask_gemini_final, extract_objectname_from_prompt
-import requests
 import json
+import time
+import asyncio
+import logging
+import functools
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Annotated, TypedDict
+from gemini_llm import ROUTING_MODE, ask_gemini, plan_tool_calls, extract_soql_from_prompt, ask_gemini_final, extract_objectname_from_prompt
+from mcp_client import MCP_TIMEOUT, MCP_EXPORT_WAIT, mcp_client
+from compaction import compact_response, COMPACTION_TOKEN_BUDGET
+from fast_router import FAST_ROUTER, fast_route, shadow_check
+from common.tracing import metrics, current_trace_id
+from sessions import (open_checkpointer, bounded_history, bounded_results, compact_thread, thread_lock, history_context, history_turn,
+                      result_key, reusable_result, NOT_REUSABLE)
+
+logger = logging.getLogger("langgraph_logic")
+
+# Reducer for the per-turn lists: parallel branches append, None (sent with every new message) resets
+def append_or_reset(items: list, update: list) -> list:
+    return [] if update is None else (items or []) + update
 
 # Define the state for the graph. This holds all data passed between nodes.
+# Tool nodes run as parallel branches, so the lists they write to are merged by reducers.
+# history and _session_results persist across the messages of a session (see sessions.py).
 class State(TypedDict, total=False):
     prompt: str  # The user's input
     result: str  # The final result to return
-    _mcp_log: list  # Log of all MCP server callouts and responses
-    _route: str  # Routing decision from Gemini
-    _response: object  # Raw response from MCP server
+    _mcp_log: Annotated[list, append_or_reset]  # Log of all MCP server callouts and responses
+    _plan: list  # Tool calls chosen by the router: [{"tool": ..., "arguments": ...}]
+    _arguments: dict  # Tool arguments of one plan step (None when they must be extracted)
+    _responses: Annotated[list, append_or_reset]  # Raw MCP responses: [{"tool", "arguments", "response"}]
+    _batched: dict  # Responses of the plan's calls sent as one MCP batch, by result_key
     _finalanswer: object  # Naturalized answer from Gemini
+    _compaction: dict  # Token estimates for the compacted MCP responses sent to Gemini
+    history: Annotated[list, bounded_history]  # Earlier turns of the session: prompt, tools, answer
+    _session_results: Annotated[dict, bounded_results]  # Compacted MCP results of the session, for reuse
 
-# Node: entry_node (conditional router)
-def entry_node(state: State) -> dict:
-    print("[Node] entry_node")
+# Plan the tool calls with Gemini. `history` (earlier turns of the session) lets the planner resolve
+# follow-ups ("and its contacts?").
+async def llm_plan(prompt: str, history: list = None) -> list:
+    # Structured mode: one Gemini call returns every tool needed and its arguments
+    if ROUTING_MODE == "structured":
+        try:
+            plan = await plan_tool_calls(prompt, history_context(history))
+            return [{"tool": tool, "arguments": arguments} for tool, arguments in plan]
+        except Exception as e:
+            logger.warning("[entry_node] Structured routing failed, falling back to multi-call routing: %s", e)
     # Use Gemini to decide which tool (if any) should handle the prompt
-    answer = ask_gemini(state["prompt"])
-    state["_route"] = answer.strip().lower()
-    return state
+    answer = (await ask_gemini(prompt)).strip().lower()
+    return [] if answer == "failback" else [{"tool": answer, "arguments": None}]
 
-# Node: query_salesforce_records - Calls MCP to run a SOQL query
+# The LLM's plan with describe arguments resolved, to compare against the fast path
+async def _reference_plan(prompt: str, history: list = None) -> list:
+    plan = await llm_plan(prompt, history)
+    for step in plan:
+        if step["tool"] == "describe_salesforce_object" and not step["arguments"]:
+            step["arguments"] = {"object_name": await extract_objectname_from_prompt(prompt)}
+    return plan
 
-def query_salesforce_records(state: State) -> dict:
-    print("[Node] query_salesforce_records")
-    # Extract SOQL query from the prompt using Gemini
-    query = extract_soql_from_prompt(state["prompt"])
-    print("     " + query)
-    json_rpc_body = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "name": "query_salesforce_records",
-            "arguments": {"query": query}
-        },
-        "id": 1
-    }
-    # Ensure MCP log exists
-    if "_mcp_log" not in state:
-        state["_mcp_log"] = []
-    # Log the callout
-    state["_mcp_log"].append({
-        "type": "call",
-        "tool": "query_salesforce_records",
-        "payload": json_rpc_body
-    })
+# Node: entry_node (planner)
+async def entry_node(state: State) -> dict:
+    # Obvious requests are routed locally; the rest (and anything ambiguous) goes to Gemini
+    if FAST_ROUTER:
+        plan, confidence, reason = await fast_route(state["prompt"])
+        metrics.inc("fast_router_decisions_total", {"path": "fast" if plan else "llm", "reason": reason},
+                    help="Routing decisions by path (fast: no Gemini call) and the rule that decided")
+        if plan:
+            logger.info("trace=%s fast route %s (confidence %.2f, %s)", current_trace_id(), plan, confidence, reason)
+            shadow_check(state["prompt"], plan, lambda: _reference_plan(state["prompt"], state.get("history")))
+    if not plan:
+        plan = await llm_plan(state["prompt"], state.get("history"))
+    return {"_plan": plan, "_batched": await batch_calls(plan, state.get("_session_results"))}
+
+# Tools whose calls are sent ahead as one batch when the plan has several of them. The MCP server
+# fetches the describes and first query pages of a batch with Composite Batch requests, so the
+# branches cost one Salesforce round trip instead of one each. Exports wait for their job instead.
+BATCHED_TOOLS = ("describe_salesforce_object", "query_salesforce_records")
+
+# Arguments a tool node calls the MCP server with, when the plan already has them (None when the node
+# has to extract them from the prompt first)
+def planned_arguments(tool_name: str, arguments: dict):
+    name = {"describe_salesforce_object": "object_name", "query_salesforce_records": "query"}.get(tool_name)
+    value = (arguments or {}).get(name) if name else None
+    return {name: value} if value else None
+
+# Send the plan's describes and queries to the MCP server as one batch; the tool nodes then take their
+# response from the returned {result_key: response} instead of calling the server themselves
+async def batch_calls(plan: list, session_results: dict) -> dict:
+    calls = {}
+    for step in plan:
+        arguments = planned_arguments(step["tool"], step["arguments"]) if step["tool"] in BATCHED_TOOLS else None
+        if arguments is not None and reusable_result(session_results, step["tool"], arguments) is None:
+            calls[result_key(step["tool"], arguments)] = (step["tool"], arguments)
+    if len(calls) < 2:
+        return {}
     try:
-        # Make the MCP server call
-        resp = requests.post("http://localhost:8010/tools/call", json=json_rpc_body)
-        resp.raise_for_status()
-        data = resp.json()
-        print(data)
-        state["_response"] = data
-        # Log the response
-        state["_mcp_log"].append({
-            "type": "response",
-            "tool": "query_salesforce_records",
-            "response": data
-        })
-        return state
+        responses = await mcp_client.call_batch(list(calls.values()))
     except Exception as e:
-        print(f"[query_salesforce_records] MCP call failed: {e}")
-        state["_mcp_log"].append({
-            "type": "response",
-            "tool": "query_salesforce_records",
-            "response": {"error": str(e)}
-        })
-        return {"result": f"MCP call failed: {e}"}
+        # The tool nodes call the server one by one instead
+        logger.warning("trace=%s MCP batch call failed: %s", current_trace_id(), e)
+        return {}
+    return dict(zip(calls, responses))
 
-# Node: describe_salesforce_object - Calls MCP to get object schema details
-def describe_salesforce_object(state: State) -> dict:
-    print("[Node] describe_salesforce_object")
-    # Extract object name from the prompt using Gemini
-    object_name = extract_objectname_from_prompt(state["prompt"])
-    json_rpc_body = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "name": "describe_salesforce_object",
-            "arguments": {"object_name": object_name}
-        },
-        "id": 1
-    }
-    if "_mcp_log" not in state:
-        state["_mcp_log"] = []
-    # Log the callout
-    state["_mcp_log"].append({
+# Call an MCP tool through the shared client. Returns the branch's partial update: the callout and
+# its response for the MCP log (also streamed as custom events), the response itself and, for
+# sessions, its compacted form. A result already fetched in the session is reused instead.
+async def call_mcp_tool(state: State, tool_name: str, arguments: dict, timeout: float = None) -> dict:
+    from langgraph.config import get_stream_writer
+    json_rpc_body = mcp_client.build_call(tool_name, arguments)
+    writer = get_stream_writer()
+    log = []
+    def log_mcp(entry: dict):
+        log.append(entry)
+        writer({"type": "mcp_log", "entry": entry})
+    reused = reusable_result(state.get("_session_results"), tool_name, arguments)
+    if reused is not None:
+        log_mcp({"type": "response", "tool": tool_name, "response": reused, "source": "session"})
+        return {"_mcp_log": log, "_responses": [{"tool": tool_name, "arguments": arguments, "response": reused}]}
+    # Log the callout (and stream it to /chat/stream clients as it happens)
+    log_mcp({
         "type": "call",
-        "tool": "describe_salesforce_object",
+        "tool": tool_name,
         "payload": json_rpc_body
     })
+    batched = (state.get("_batched") or {}).get(result_key(tool_name, arguments))
     try:
-        # Make the MCP server call
-        resp = requests.post("http://localhost:8010/tools/call", json=json_rpc_body)
-        resp.raise_for_status()
-        data = resp.json()
-        state["_response"] = data
-        # Log the response
-        state["_mcp_log"].append({
-            "type": "response",
-            "tool": "describe_salesforce_object",
-            "response": data
-        })
-        return state
+        # Make the MCP server call, unless entry_node already sent it in a batch
+        data = batched if batched is not None else await mcp_client.call_tool(tool_name, arguments, timeout=timeout)
+        logger.debug("[%s] response %s", tool_name, data)
     except Exception as e:
-        print(f"[describe_salesforce_object] MCP call failed: {e}")
-        state["_mcp_log"].append({
-            "type": "response",
-            "tool": "describe_salesforce_object",
-            "response": {"error": str(e)}
-        })
-        return {"result": f"MCP call failed: {e}"}
+        logger.warning("[%s] MCP call failed: %s", tool_name, e)
+        data = {"error": f"MCP call failed: {e}"}
+    # Log the response
+    log_mcp({
+        "type": "response",
+        "tool": tool_name,
+        "response": data
+    })
+    update = {"_mcp_log": log, "_responses": [{"tool": tool_name, "arguments": arguments, "response": data}]}
+    if "error" not in data and tool_name not in NOT_REUSABLE:
+        # Sessions keep the compacted response only, which is what the summary is built from anyway
+        compacted, _ = compact_response(data)
+        update["_session_results"] = {result_key(tool_name, arguments): {"response": json.loads(compacted), "at": time.time()}}
+    return update
+
+# Node: query_salesforce_records - Calls MCP to run a SOQL query
+async def query_salesforce_records(state: State) -> dict:
+    # Use the query from structured routing, or extract it from the prompt using Gemini
+    arguments = planned_arguments("query_salesforce_records", state.get("_arguments")) or {"query": await extract_soql_from_prompt(state["prompt"])}
+    logger.info("[query_salesforce_records] %s", arguments["query"])
+    return await call_mcp_tool(state, "query_salesforce_records", arguments)
+
+# Node: describe_salesforce_object - Calls MCP to get object schema details
+async def describe_salesforce_object(state: State) -> dict:
+    # Use the object name from structured routing, or extract it from the prompt using Gemini
+    arguments = planned_arguments("describe_salesforce_object", state.get("_arguments")) or {"object_name": await extract_objectname_from_prompt(state["prompt"])}
+    return await call_mcp_tool(state, "describe_salesforce_object", arguments)
+
+# Node: export_salesforce_records - Calls MCP to export a large result set with the Bulk API
+async def export_salesforce_records(state: State) -> dict:
+    arguments = dict(state.get("_arguments") or {})
+    # Following up on a running export only needs its export_id
+    if not arguments.get("export_id") and not arguments.get("query"):
+        arguments["query"] = await extract_soql_from_prompt(state["prompt"])
+    logger.info("[export_salesforce_records] %s", arguments)
+    # The server returns the handle after `wait` seconds even if the export is still running
+    arguments["wait"] = MCP_EXPORT_WAIT
+    return await call_mcp_tool(state, "export_salesforce_records", arguments, timeout=MCP_TIMEOUT + MCP_EXPORT_WAIT)
 
 # Node: list_salesforce_objects - Calls MCP to list all objects
-def list_salesforce_objects(state: State) -> dict:
-    print("[Node] list_salesforce_objects")
-    json_rpc_body = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "name": "list_salesforce_objects",
-            "arguments": {}
-        },
-        "id": 1
-    }
-    if "_mcp_log" not in state:
-        state["_mcp_log"] = []
-    # Log the callout
-    state["_mcp_log"].append({
-        "type": "call",
-        "tool": "list_salesforce_objects",
-        "payload": json_rpc_body
-    })
-    try:
-        # Make the MCP server call
-        resp = requests.post("http://localhost:8010/tools/call", json=json_rpc_body)
-        resp.raise_for_status()
-        data = resp.json()
-        print("     " + str(data))
-        state["_response"] = data
-        # Log the response
-        state["_mcp_log"].append({
-            "type": "response",
-            "tool": "list_salesforce_objects",
-            "response": data
-        })
-        return state
-    except Exception as e:
-        print(f"[list_salesforce_objects] MCP call failed: {e}")
-        state["_mcp_log"].append({
-            "type": "response",
-            "tool": "list_salesforce_objects",
-            "response": {"error": str(e)}
-        })
+async def list_salesforce_objects(state: State) -> dict:
+    return await call_mcp_tool(state, "list_salesforce_objects", {})
+
+# Compact the MCP responses for the summarization prompt. A single response is compacted as before;
+# several responses share the token budget and are labelled with the tool call that produced them.
+def compact_responses(responses: list):
+    if len(responses) == 1:
+        return compact_response(responses[0]["response"])
+    budget = COMPACTION_TOKEN_BUDGET // max(len(responses), 1)
+    parts, totals = [], {"tokens_before": 0, "tokens_after": 0, "tokens_saved": 0}
+    for item in responses:
+        compacted, stats = compact_response(item["response"], budget)
+        parts.append({"tool": item["tool"], "arguments": item["arguments"], "response": json.loads(compacted)})
+        for key in totals:
+            totals[key] += stats[key]
+    return json.dumps(parts, separators=(",", ":"), ensure_ascii=False, default=str), totals
 
 # Node: final_node - Uses Gemini to naturalize the MCP response
-def final_node(state: State) -> dict:
+async def final_node(state: State) -> dict:
+    from langgraph.config import get_stream_writer
+    writer = get_stream_writer()
+    streamed = []
+    # Stream each token of the summary to /chat/stream clients as Gemini produces it
+    def on_token(text: str):
+        streamed.append(text)
+        writer({"type": "token", "text": text})
+    # Compact the MCP responses (columns only, no attributes, token budget) before they reach the prompt
+    compacted, compaction = compact_responses(state.get("_responses") or [])
+    logger.info("[final_node] compaction saved %s of %s tokens", compaction["tokens_saved"], compaction["tokens_before"])
     # Use Gemini to turn the JSON response into a natural language answer
-    answer = ask_gemini_final(state.get("_response"))
-    state["_finalanswer"] = answer.strip()
-    return {"result": state.get("_finalanswer")}
+    answer = await ask_gemini_final(compacted, on_token=on_token)
+    if not streamed and answer:
+        # Served from the prompt cache: send the whole answer as a single token event
+        writer({"type": "token", "text": answer})
+    return {
+        "result": answer.strip(),
+        "_finalanswer": answer.strip(),
+        "_compaction": compaction,
+        "history": [history_turn(state["prompt"], state.get("_plan"), answer.strip())],
+    }
 
 # Node: failback - Handles prompts that can't be mapped to a tool
-def failback(state: State) -> dict:
-    print("[Node] failback")
-    return {"result": "Sorry, your question cannot be translated to a Salesforce context."}
+async def failback(state: State) -> dict:
+    result = "Sorry, your question cannot be translated to a Salesforce context."
+    return {"result": result, "history": [history_turn(state["prompt"], [], result)]}
 
-# Conditional router for entry_node
+TOOL_NODES = ("list_salesforce_objects", "describe_salesforce_object", "query_salesforce_records", "export_salesforce_records")
+
+# Conditional router for entry_node: fans the plan out as parallel branches (one Send per tool call);
+# the tool nodes all lead to final_node, which runs once every branch has finished
 def entry_router(state: State):
-    print ("state: " + state.get("_route"))
-    return state.get("_route")
-
-# Build the LangGraph workflow
-workflow = StateGraph(State)
-workflow.add_node("entry_node", entry_node)
-workflow.add_node("list_salesforce_objects", list_salesforce_objects)
-workflow.add_node("describe_salesforce_object", describe_salesforce_object)
-workflow.add_node("query_salesforce_records", query_salesforce_records)
-workflow.add_node("failback", failback)
-workflow.add_node("final_node", final_node)
-workflow.set_entry_point("entry_node")
-workflow.add_conditional_edges(
-    "entry_node",  entry_router,
-    {
-        "list_salesforce_objects": "list_salesforce_objects", 
-        "describe_salesforce_object": "describe_salesforce_object", 
-        "query_salesforce_records": "query_salesforce_records", 
-        "failback": "failback"
-    }
-)
-workflow.set_finish_point("failback")
-workflow.set_finish_point("final_node")
-workflow.add_edge("list_salesforce_objects", "final_node")
-workflow.add_edge("describe_salesforce_object", "final_node")
-workflow.add_edge("query_salesforce_records", "final_node")
-graph = workflow.compile()
+    from langgraph.types import Send
+    plan = [step for step in state.get("_plan") or [] if step["tool"] in TOOL_NODES]
+    logger.info("trace=%s plan=%s", current_trace_id(), [step["tool"] for step in plan] or "failback")
+    if not plan:
+        return "failback"
+    return [
+        Send(step["tool"], {"prompt": state["prompt"], "_arguments": step["arguments"], "_session_results": state.get("_session_results"),
+                            "_batched": state.get("_batched")})
+        for step in plan
+    ]
+
+# Wrap an async graph node: records its wall time under langgraph_node_duration_seconds{node=...}
+def traced_node(name: str, node):
+    @functools.wraps(node)
+    async def wrapper(state):
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await node(state)
+            status = "ok"
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe("langgraph_node_duration_seconds", {"node": name, "status": status}, elapsed,
+                            help="Wall time of each LangGraph node")
+            logger.info("trace=%s node=%s status=%s duration_ms=%.1f", current_trace_id(), name, status, elapsed * 1000)
+    return wrapper
+
+# Build the LangGraph workflow (every node is wrapped to record its wall time). langgraph takes about a
+# second to import, so the workflow is built and compiled on first use (or by the startup warmup).
+def build_workflow():
+    from langgraph.graph import StateGraph
+    workflow = StateGraph(State)
+    workflow.add_node("entry_node", traced_node("entry_node", entry_node))
+    workflow.add_node("list_salesforce_objects", traced_node("list_salesforce_objects", list_salesforce_objects))
+    workflow.add_node("describe_salesforce_object", traced_node("describe_salesforce_object", describe_salesforce_object))
+    workflow.add_node("query_salesforce_records", traced_node("query_salesforce_records", query_salesforce_records))
+    workflow.add_node("export_salesforce_records", traced_node("export_salesforce_records", export_salesforce_records))
+    workflow.add_node("failback", traced_node("failback", failback))
+    workflow.add_node("final_node", traced_node("final_node", final_node))
+    workflow.set_entry_point("entry_node")
+    workflow.add_conditional_edges("entry_node", entry_router, [*TOOL_NODES, "failback"])
+    workflow.set_finish_point("failback")
+    workflow.set_finish_point("final_node")
+    for tool_node in TOOL_NODES:
+        workflow.add_edge(tool_node, "final_node")
+    return workflow
+
+_graph = None
+# Same workflow with a checkpointer, for chats sent with a session_id (set up by open_sessions)
+session_graph = None
+_sessions_ready = asyncio.Event()
+
+def get_graph():
+    global _graph
+    if _graph is None:
+        _graph = build_workflow().compile()
+    return _graph
+
+# Open the checkpointer and compile the session graph for the lifetime of the app. Both happen in the
+# background, so the app starts serving right away; session chats wait for them (see _session_run).
+@asynccontextmanager
+async def open_sessions():
+    global session_graph
+    stack = AsyncExitStack()
+    async def start():
+        global session_graph
+        try:
+            saver = await stack.enter_async_context(open_checkpointer())
+            if saver is not None:
+                session_graph = await asyncio.to_thread(lambda: build_workflow().compile(checkpointer=saver))
+        except Exception as e:
+            logger.error("Chat sessions unavailable, the checkpointer failed to open: %s", e)
+        finally:
+            _sessions_ready.set()
+    task = asyncio.create_task(start())
+    try:
+        yield
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await stack.aclose()
+        session_graph = None
+        _sessions_ready.clear()
+
+# Wait until open_sessions has finished setting up (returns whether sessions are available)
+async def sessions_ready() -> bool:
+    await _sessions_ready.wait()
+    return session_graph is not None
+
+# Input of one message: per-turn fields are reset, session fields (history, results) carry over
+def _turn_input(prompt: str) -> dict:
+    return {"prompt": prompt, "result": "", "_plan": [], "_mcp_log": None, "_responses": None, "_batched": None, "_compaction": None}
+
+# Graph and run options for a message: sessions run on their own thread and checkpoint once, at the end.
+# Messages of one session run one at a time, each followed by the compaction of its checkpoint, so a
+# turn always starts from the previous turn's compacted state.
+@asynccontextmanager
+async def _session_run(session_id: str = None):
+    if session_id and await sessions_ready():
+        async with thread_lock(session_id):
+            yield session_graph, {"config": {"configurable": {"thread_id": session_id}}, "durability": "exit"}
+            await compact_thread(session_graph.checkpointer, session_id)
+    else:
+        yield get_graph(), {}
 
 # Entrypoint for FastAPI to run the workflow
-def run_langgraph(prompt: str) -> dict:
-    print('on run_langgraph '+prompt)
-    # Initialize state with empty MCP log
-    state = {"prompt": prompt, "result": "", "_route": "", "_mcp_log": []}
-    result = graph.invoke(state)
+async def run_langgraph(prompt: str, session_id: str = None) -> dict:
+    logger.info("trace=%s session=%s run_langgraph %s", current_trace_id(), session_id, prompt)
+    async with _session_run(session_id) as (runner, options):
+        result = await runner.ainvoke(_turn_input(prompt), **options)
     # Return both the final result and the MCP log for frontend display
     return {
         "result": result["result"],
-        "mcp_log": result.get("_mcp_log", [])
-    } 
\ No newline at end of file
+        "mcp_log": result.get("_mcp_log", []),
+        "compaction": result.get("_compaction")
+    }
+
+# Streaming entrypoint for FastAPI: yields node transitions, MCP log entries and summary tokens as they happen
+async def stream_langgraph(prompt: str, session_id: str = None):
+    logger.info("trace=%s session=%s stream_langgraph %s", current_trace_id(), session_id, prompt)
+    final = {"result": "", "_mcp_log": [], "_responses": []}
+    async with _session_run(session_id) as (runner, options):
+        async for mode, chunk in runner.astream(_turn_input(prompt), stream_mode=["updates", "custom"], **options):
+            if mode == "custom":
+                yield chunk
+                continue
+            for node, update in chunk.items():
+                for key, value in (update or {}).items():
+                    # Mirror the graph's reducers: parallel branches append to the lists
+                    final[key] = final.get(key, []) + value if key in ("_mcp_log", "_responses") else value
+                yield {"type": "node", "node": node}
+    yield {
+        "type": "done",
+        "result": final.get("result"),
+        "mcp_log": final.get("_mcp_log", []),
+        "compaction": final.get("_compaction")
+    }
+
+# Forget a session (its history and reused results)
+async def delete_session(session_id: str) -> bool:
+    if not await sessions_ready():
+        return False
+    await session_graph.checkpointer.adelete_thread(session_id)
+    return True
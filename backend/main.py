@@ -1,13 +1,77 @@
 # FastAPI backend for the Salesforce LangGraph chat application
+import os
+import sys
+# cache.py and tracing.py are shared with the MCP server, in common/ at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
+from typing import Optional
+import json
+import time
+import asyncio
+import logging
 import uvicorn
-from langgraph_logic import run_langgraph
+from langgraph_logic import run_langgraph, stream_langgraph, open_sessions, sessions_ready, delete_session, get_graph
+from gemini_llm import warm_up as warm_up_gemini
+from mcp_client import mcp_client
+from prompt_cache import prompt_caches
+from fast_router import FAST_ROUTER, router_stats, salesforce_objects
+from common.tracing import metrics, TraceMiddleware
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+# Launch mode for `python main.py`: WORKERS > 1 runs that many uvicorn worker processes (set
+# CACHE_BACKEND so they share caches); on shutdown, in-flight requests get up to
+# GRACEFUL_SHUTDOWN_TIMEOUT seconds to finish
+SERVER_WORKERS = int(os.getenv("WORKERS", "1"))
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+
+logger = logging.getLogger("main")
+
+# Startup warmup, run in the background so a new worker accepts connections right away: compile the
+# graph, load the Gemini SDK, open the session checkpointer and fill the tool catalog and sObject
+# caches. Progress per step is reported by /ready.
+warmup = {}  # step -> {"status": "pending" | "ok" | "error", "seconds": ..., "error": ...}
+# Steps a worker needs before it takes traffic; the cache warmups only speed up the first requests
+READY_STEPS = ("graph", "gemini", "sessions")
+
+async def _warm(step: str, work):
+    warmup[step] = {"status": "pending"}
+    started = time.perf_counter()
+    try:
+        if await work is None and step in ("tools", "sobjects"):
+            raise RuntimeError("MCP server unavailable")
+        warmup[step] = {"status": "ok", "seconds": round(time.perf_counter() - started, 3)}
+    except Exception as e:
+        logger.warning("Warmup step %s failed: %s", step, e)
+        warmup[step] = {"status": "error", "seconds": round(time.perf_counter() - started, 3), "error": str(e)}
+
+async def warm_up():
+    steps = {
+        "graph": asyncio.to_thread(get_graph),
+        "gemini": warm_up_gemini(),
+        "sessions": sessions_ready(),
+        "tools": mcp_client.list_tools(),
+    }
+    if FAST_ROUTER:
+        steps["sobjects"] = salesforce_objects()
+    await asyncio.gather(*(_warm(step, work) for step, work in steps.items()))
+
+# Open the session checkpointer and start the warmup on startup; close the checkpointer and the
+# pooled MCP connections on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with open_sessions():
+        task = asyncio.create_task(warm_up())
+        yield
+        task.cancel()
+    await mcp_client.aclose()
 
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for all origins (for development/demo purposes)
 app.add_middleware(
@@ -16,18 +80,93 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
+# Trace ID per request (X-Trace-Id) and request duration metrics
+app.add_middleware(TraceMiddleware)
 
 # Pydantic model for chat request body
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None  # Messages with the same session_id share history and fetched results
 
 # Main chat endpoint: receives user message, runs LangGraph, returns response and MCP log
 @app.post("/chat")
 async def chat_endpoint(request: ChatRequest):
-    response = run_langgraph(request.message)
+    response = await run_langgraph(request.message, request.session_id)
+    response["session_id"] = request.session_id
     return JSONResponse(response)
 
+# Streaming chat endpoint: newline-delimited JSON events (node transitions, MCP log entries,
+# summary tokens) followed by a final "done" event carrying the full result and MCP log
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    async def events():
+        try:
+            async for event in stream_langgraph(request.message, request.session_id):
+                yield json.dumps(event, default=str) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+# Forget a chat session (history and reused results)
+@app.delete("/sessions/{session_id}")
+async def session_delete(session_id: str):
+    return {"deleted": await delete_session(session_id)}
+
+# MCP client counters: requests, connections opened/reused and latency
+@app.get("/mcp/stats")
+async def mcp_stats():
+    return mcp_client.stats()
+
+# Orchestrator-side cache metrics, including prompt cache hit rates per route
+@app.get("/cache/stats")
+async def cache_stats():
+    return await asyncio.to_thread(lambda: {
+        "tools": mcp_client.tools_cache.stats(),
+        "prompts": {route: cache.stats() for route, cache in prompt_caches.items()},
+    })
+
+# Drop the cached MCP tool catalog and prompt caches (e.g. after deploying new tools)
+@app.post("/cache/invalidate")
+async def cache_invalidate():
+    invalidated = {"tools": await mcp_client.tools_cache.ainvalidate()}
+    for route, cache in prompt_caches.items():
+        invalidated[f"prompts.{route}"] = await cache.ainvalidate()
+    return {"invalidated": invalidated}
+
+# Readiness probe: 200 once the graph, the Gemini SDK and the session checkpointer are ready, 503 before
+@app.get("/ready")
+async def ready():
+    is_ready = all(warmup.get(step, {}).get("status") == "ok" for step in READY_STEPS)
+    return JSONResponse(status_code=200 if is_ready else 503, content={"ready": is_ready, "steps": warmup})
+
+# Fast-path router: share of messages routed without Gemini and agreement with the LLM on sampled ones
+@app.get("/router/stats")
+async def router_stats_endpoint():
+    return router_stats()
+
+# Prometheus-style metrics: node, Gemini and MCP latencies, token counts, payload sizes, caches
+@app.get("/metrics")
+async def metrics_endpoint():
+    samples = await asyncio.to_thread(metrics.collect)
+    return PlainTextResponse(metrics.render(samples), media_type="text/plain; version=0.0.4")
+
+# Export cache sizes and hit counts as gauges on /metrics
+def _cache_samples():
+    samples = []
+    for route, cache in prompt_caches.items():
+        for name, value in cache.stats().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                samples.append((f"prompt_cache_{name}", {"route": route}, value))
+    for name, value in mcp_client.tools_cache.stats().items():
+        samples.append((f"tools_cache_{name}", None, value))
+    return samples
+
+metrics.register_collector(_cache_samples)
+
 # Run the server if executed directly
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # Worker processes import the app themselves, which needs its import string
+    uvicorn.run(app if SERVER_WORKERS == 1 else "main:app", host="0.0.0.0", port=8000,
+                workers=SERVER_WORKERS, timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT)
@@ -0,0 +1,200 @@
+# Shared JSON-RPC client for the Salesforce MCP server
+# A single pooled httpx.AsyncClient is reused by every graph node and Gemini helper,
+# so MCP calls ride on kept-alive connections instead of opening a new socket each time.
+import os
+import json
+import time
+import asyncio
+import httpx
+from common.cache import TTLCache
+from common.tracing import metrics, current_trace_id, TRACE_HEADER, SIZE_BUCKETS
+
+# Optional fast decoders: MessagePack bodies are only requested when msgpack is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Connection settings (override with environment variables)
+MCP_BASE_URL = os.getenv("MCP_BASE_URL", "http://localhost:8010")
+MCP_MAX_CONNECTIONS = int(os.getenv("MCP_MAX_CONNECTIONS", "50"))
+MCP_MAX_KEEPALIVE = int(os.getenv("MCP_MAX_KEEPALIVE", "20"))
+MCP_KEEPALIVE_EXPIRY = float(os.getenv("MCP_KEEPALIVE_EXPIRY", "30"))
+MCP_CONNECT_TIMEOUT = float(os.getenv("MCP_CONNECT_TIMEOUT", "5"))
+MCP_TIMEOUT = float(os.getenv("MCP_TIMEOUT", "60"))
+# How long an export call asks the MCP server to wait for the export before returning its handle; the
+# call's read timeout is extended by this much so the handle always arrives
+MCP_EXPORT_WAIT = float(os.getenv("MCP_EXPORT_WAIT", "20"))
+# The MCP tool catalog is static between deploys, so it is cached instead of fetched per message
+MCP_TOOLS_CACHE_TTL = float(os.getenv("MCP_TOOLS_CACHE_TTL", "600"))
+# Response encoding requested from the MCP server: "msgpack" (when installed) or "json". Compression
+# (zstd or gzip) is negotiated by httpx, which advertises and decodes whatever it supports.
+MCP_WIRE_FORMAT = os.getenv("MCP_WIRE_FORMAT", "msgpack").lower()
+# Ask for query records as a header plus value arrays instead of one object per record
+MCP_COLUMNAR_RECORDS = os.getenv("MCP_COLUMNAR_RECORDS", "true").lower() in ("1", "true", "yes")
+
+MSGPACK = "application/msgpack"
+
+
+# Request headers for the negotiated response format
+def _format_headers() -> dict:
+    headers = {"Accept": f"{MSGPACK}, application/json;q=0.9" if MCP_WIRE_FORMAT == "msgpack" and msgpack is not None else "application/json"}
+    if MCP_COLUMNAR_RECORDS:
+        headers["X-Records-Format"] = "columnar"
+    return headers
+
+
+# Decode a response body according to its content type
+def decode_body(resp: httpx.Response):
+    if resp.headers.get("content-type", "").startswith(MSGPACK):
+        return msgpack.unpackb(resp.content)
+    return orjson.loads(resp.content) if orjson is not None else json.loads(resp.content)
+
+
+class MCPClient:
+    def __init__(
+        self,
+        base_url: str = MCP_BASE_URL,
+        max_connections: int = MCP_MAX_CONNECTIONS,
+        max_keepalive: int = MCP_MAX_KEEPALIVE,
+        keepalive_expiry: float = MCP_KEEPALIVE_EXPIRY,
+        connect_timeout: float = MCP_CONNECT_TIMEOUT,
+        timeout: float = MCP_TIMEOUT,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._client = None
+        self._loop = None
+        self.tools_cache = TTLCache("tools", max_size=1, ttl=MCP_TOOLS_CACHE_TTL)
+        self._headers = _format_headers()
+        self.reset_stats()
+
+    # The underlying httpx client is created on first use, inside the running event loop.
+    # Pooled connections belong to that loop, so a new loop (e.g. a test client) gets a new pool.
+    def _http(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self._limits,
+                timeout=self._timeout,
+            )
+        return self._client
+
+    # httpcore trace hook: counts every new TCP connection the pool has to open
+    async def _trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self._stats["connections_opened"] += 1
+
+    async def _request(self, method: str, path: str, operation: str = None, **kwargs) -> dict:
+        started = time.perf_counter()
+        self._stats["requests"] += 1
+        status = "error"
+        response_bytes = wire_bytes = 0
+        headers = dict(self._headers)
+        # Forward the trace ID so the MCP server logs and metrics can be joined with ours
+        if current_trace_id():
+            headers[TRACE_HEADER] = current_trace_id()
+        try:
+            resp = await self._http().request(method, path, headers=headers, extensions={"trace": self._trace}, **kwargs)
+            resp.raise_for_status()
+            response_bytes, wire_bytes = len(resp.content), resp.num_bytes_downloaded
+            data = decode_body(resp)
+            status = "ok"
+            return data
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            elapsed_ms = elapsed * 1000
+            self._stats["total_latency_ms"] += elapsed_ms
+            self._stats["max_latency_ms"] = max(self._stats["max_latency_ms"], elapsed_ms)
+            labels = {"operation": operation or path}
+            metrics.observe("mcp_request_duration_seconds", {**labels, "status": status}, elapsed,
+                            help="Wall time of each MCP server request")
+            metrics.observe("mcp_response_bytes", labels, response_bytes, buckets=SIZE_BUCKETS,
+                            help="Size of each MCP server response")
+            metrics.observe("mcp_response_wire_bytes", labels, wire_bytes, buckets=SIZE_BUCKETS,
+                            help="Size of each MCP server response as transferred (after compression)")
+
+    # GET /tools - returns the MCP tool catalog (cached; empty catalogs are not cached)
+    async def list_tools(self) -> list:
+        tools = await self.tools_cache.aget("all")
+        if tools is not None:
+            return tools
+        data = await self._request("GET", "/tools", operation="list_tools")
+        tools = data.get("result", {}).get("tools", [])
+        if tools:
+            await self.tools_cache.aset("all", tools)
+        return tools
+
+    # POST /tools/call - runs a single JSON-RPC tool call and returns the raw JSON-RPC response.
+    # `timeout` overrides the read timeout for calls that are expected to take longer (exports).
+    async def call_tool(self, name: str, arguments: dict, request_id=None, timeout: float = None) -> dict:
+        options = {"timeout": httpx.Timeout(timeout, connect=self._timeout.connect)} if timeout else {}
+        return await self._request("POST", "/tools/call", operation=name, json=self.build_call(name, arguments, request_id), **options)
+
+    # Send several tool calls as one JSON-RPC batch; `calls` is a list of (name, arguments).
+    # Returns the responses in the order of `calls` (the server may answer them in any order).
+    async def call_batch(self, calls: list) -> list:
+        prefix = current_trace_id() or "batch"
+        bodies = [self.build_call(name, arguments, f"{prefix}.{i}") for i, (name, arguments) in enumerate(calls)]
+        operation = ",".join(sorted({name for name, _ in calls}))
+        responses = await self._request("POST", "/tools/call", operation=operation, json=bodies)
+        by_id = {response.get("id"): response for response in responses if isinstance(response, dict)}
+        return [by_id.get(body["id"], {"jsonrpc": "2.0", "error": {"code": -32603, "message": "Missing batch response"}, "id": body["id"]})
+                for body in bodies]
+
+    # The JSON-RPC id defaults to the current trace ID, so one chat turn can be followed end to end
+    @staticmethod
+    def build_call(name: str, arguments: dict, request_id=None) -> dict:
+        if request_id is None:
+            request_id = current_trace_id() or 1
+        return {
+            "jsonrpc": "2.0",
+            "method": "call",
+            "params": {
+                "name": name,
+                "arguments": arguments
+            },
+            "id": request_id
+        }
+
+    # Connection and latency counters; connections_reused shows what keep-alive saved
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["connections_reused"] = max(stats["requests"] - stats["connections_opened"], 0)
+        stats["avg_latency_ms"] = stats["total_latency_ms"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def reset_stats(self):
+        self._stats = {
+            "requests": 0,
+            "errors": 0,
+            "connections_opened": 0,
+            "total_latency_ms": 0.0,
+            "max_latency_ms": 0.0,
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Process-wide client shared by all graph nodes
+mcp_client = MCPClient()
+
+# Export the client counters as gauges on /metrics
+metrics.register_collector(lambda: [(f"mcp_client_{name}", None, value) for name, value in mcp_client.stats().items()])
@@ -0,0 +1,201 @@
+# Prompt cache for the Gemini helpers
+# Lookups first try an exact match on the normalized prompt, then (optionally) a nearest-neighbour
+# search over prompt embeddings. Each helper has its own route, so routing and SOQL generation can be
+# cached while final summaries stay fresh.
+import os
+import re
+import math
+import zlib
+import functools
+from collections import OrderedDict
+from common.cache import TTLCache
+
+# Routes that are cached; "final" (ask_gemini_final) is left out by default so summaries stay fresh
+PROMPT_CACHE_ROUTES = [r.strip() for r in os.getenv("PROMPT_CACHE_ROUTES", "route,soql,objectname").split(",") if r.strip()]
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "1024"))
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", "3600"))
+# Embedder for similarity lookups: "none" (exact match only), "ngram" (hashed character n-grams, no
+# dependencies) or "sentence-transformers:<model>" (requires the sentence-transformers package)
+PROMPT_CACHE_EMBEDDER = os.getenv("PROMPT_CACHE_EMBEDDER", "none")
+PROMPT_CACHE_THRESHOLD = float(os.getenv("PROMPT_CACHE_THRESHOLD", "0.92"))
+
+# Numbers and quoted literals change the meaning of a query, so similar prompts must agree on them
+_LITERALS = re.compile(r"'[^']*'|\"[^\"]*\"|-?\d+(?:\.\d+)?")
+# So do negations and comparisons: "accounts not in Technology" must not reuse "accounts in Technology"
+_QUALIFIERS = re.compile(
+    r"\b(?:not|no|none|never|without|except|excluding|exclude|other|more|less|greater|fewer|over|under|above|"
+    r"below|before|after|since|until|least|most|older|newer|earlier|later)\b|n't\b|[<>=!]+"
+)
+
+
+def normalize_prompt(prompt: str) -> str:
+    prompt = prompt.lower()
+    # Keep quotes, digits, signs and comparison operators, drop other punctuation
+    prompt = re.sub(r"[^\w\s'\".<>=!-]", " ", prompt)
+    prompt = re.sub(r"\.(?!\d)", " ", prompt)
+    # "amount>5000" and "amount > 5000" are the same prompt
+    prompt = re.sub(r"[<>=!]+", lambda match: f" {match.group(0)} ", prompt)
+    return " ".join(prompt.split())
+
+
+# What a similar prompt must share exactly before its cached value can be reused
+def _meaning(key: str) -> tuple:
+    return sorted(_LITERALS.findall(key)), sorted(_QUALIFIERS.findall(key))
+
+
+# Hashed character n-gram vectors: cheap, local and good enough for rewordings of the same question
+class NgramEmbedder:
+    def __init__(self, n: int = 3, dimensions: int = 2048):
+        self.n = n
+        self.dimensions = dimensions
+
+    def embed(self, text: str) -> dict:
+        vector = {}
+        for word in text.split():
+            padded = f" {word} "
+            grams = [padded[i:i + self.n] for i in range(max(len(padded) - self.n + 1, 1))] + [word]
+            for gram in grams:
+                index = zlib.crc32(gram.encode()) % self.dimensions
+                vector[index] = vector.get(index, 0.0) + 1.0
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {k: v / norm for k, v in vector.items()}
+
+    @staticmethod
+    def similarity(a: dict, b: dict) -> float:
+        if len(a) > len(b):
+            a, b = b, a
+        return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+# Dense embeddings from a local sentence-transformers model (optional dependency)
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("PROMPT_CACHE_EMBEDDER=sentence-transformers requires the sentence-transformers package") from e
+        self._model = SentenceTransformer(model_name)
+
+    def embed(self, text: str) -> list:
+        return self._model.encode(text, normalize_embeddings=True).tolist()
+
+    @staticmethod
+    def similarity(a: list, b: list) -> float:
+        return sum(x * y for x, y in zip(a, b))
+
+
+def make_embedder(spec: str):
+    if not spec or spec == "none":
+        return None
+    if spec == "ngram":
+        return NgramEmbedder()
+    if spec.startswith("sentence-transformers"):
+        _, _, model_name = spec.partition(":")
+        return SentenceTransformerEmbedder(model_name or "all-MiniLM-L6-v2")
+    raise ValueError(f"Unknown PROMPT_CACHE_EMBEDDER: {spec}")
+
+
+class PromptCache:
+    def __init__(self, route: str, max_size: int = PROMPT_CACHE_SIZE, ttl: float = PROMPT_CACHE_TTL,
+                 embedder=None, threshold: float = PROMPT_CACHE_THRESHOLD, enabled: bool = True):
+        self.route = route
+        self.enabled = enabled
+        self.embedder = embedder
+        self.threshold = threshold
+        self._entries = TTLCache(route, max_size=max_size, ttl=ttl)
+        self._vectors = OrderedDict()  # normalized prompt -> (embedding, literals and qualifiers)
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    # Vectors stay on the event loop; only the entry lookups go to the (possibly shared) store
+    async def aget(self, prompt: str):
+        key = normalize_prompt(prompt)
+        value = await self._entries.aget(key)
+        if value is not None:
+            self.exact_hits += 1
+            return value
+        if self.embedder is not None and self._vectors:
+            value = await self._nearest(key)
+            if value is not None:
+                self.semantic_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    # Linear scan over the stored vectors; the cache is size-bounded so this stays cheap
+    async def _nearest(self, key: str):
+        vector = self.embedder.embed(key)
+        meaning = _meaning(key)
+        best_key, best_score = None, self.threshold
+        for other_key, (other_vector, other_meaning) in self._vectors.items():
+            if other_meaning != meaning:
+                continue
+            score = self.embedder.similarity(vector, other_vector)
+            if score >= best_score:
+                best_key, best_score = other_key, score
+        if best_key is None:
+            return None
+        value = await self._entries.aget(best_key)
+        if value is None:
+            # The entry expired or was evicted; drop its stale vector
+            self._vectors.pop(best_key, None)
+        return value
+
+    async def aset(self, prompt: str, value):
+        key = normalize_prompt(prompt)
+        await self._entries.aset(key, value)
+        if self.embedder is not None:
+            self._vectors[key] = (self.embedder.embed(key), _meaning(key))
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self._entries.max_size:
+                self._vectors.popitem(last=False)
+
+    async def ainvalidate(self) -> int:
+        self._vectors.clear()
+        return await self._entries.ainvalidate()
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": self._entries.stats()["size"],
+            "evictions": self._entries.evictions,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "threshold": self.threshold if self.embedder is not None else None,
+        }
+
+
+# Structured routing (tool + arguments) caches a different value shape than plain routing,
+# so it has its own cache but shares the "route" toggle
+_TOGGLES = {"structured": "route"}
+_embedder = make_embedder(PROMPT_CACHE_EMBEDDER)
+prompt_caches = {
+    route: PromptCache(route, embedder=_embedder, enabled=_TOGGLES.get(route, route) in PROMPT_CACHE_ROUTES)
+    for route in ("route", "structured", "soql", "objectname", "final")
+}
+
+
+# Decorator for async Gemini helpers whose first argument is the user prompt.
+# `should_cache` can veto caching a result (e.g. a failback caused by a transient error).
+def cached_prompt(route: str, should_cache=lambda value: True):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(prompt, *args, **kwargs):
+            cache = prompt_caches[route]
+            if not cache.enabled:
+                return await func(prompt, *args, **kwargs)
+            # Extra positional arguments (e.g. session context) are part of the key
+            key = "\n".join(str(part) for part in (prompt, *args) if part)
+            value = await cache.aget(key)
+            if value is not None:
+                return value
+            value = await func(prompt, *args, **kwargs)
+            if value is not None and should_cache(value):
+                await cache.aset(key, value)
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,133 @@
+# Session state for follow-up questions
+# A chat sent with a session_id runs on a LangGraph thread persisted by a checkpointer, so the next
+# message of the same session starts from the previous state: the last turns (for the planner) and
+# the compacted MCP results already fetched (describes, queries), which tool nodes reuse instead of
+# calling the MCP server again. Both are bounded, and each thread keeps only its latest checkpoint.
+import os
+import json
+import time
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger("sessions")
+
+# Checkpointer backend: "sqlite" (CHECKPOINT_DB file), "memory" (lost on restart) or "none" (no sessions)
+CHECKPOINTER = os.getenv("CHECKPOINTER", "sqlite").lower()
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.sqlite")
+# Turns kept per session for follow-up context, and characters kept of each answer
+SESSION_HISTORY_TURNS = int(os.getenv("SESSION_HISTORY_TURNS", "5"))
+SESSION_ANSWER_CHARS = int(os.getenv("SESSION_ANSWER_CHARS", "300"))
+# MCP results kept per session for reuse, and how long (seconds) a result may be reused
+SESSION_MAX_RESULTS = int(os.getenv("SESSION_MAX_RESULTS", "10"))
+SESSION_RESULT_TTL = float(os.getenv("SESSION_RESULT_TTL", "300"))
+
+
+# Open the configured checkpointer for the lifetime of the app; yields None when sessions are disabled
+@asynccontextmanager
+async def open_checkpointer():
+    if CHECKPOINTER == "sqlite":
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        async with AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB) as saver:
+            yield saver
+    elif CHECKPOINTER == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+        yield InMemorySaver()
+    else:
+        yield None
+
+
+# State channels that carry over to the next message of a session. Everything else (raw MCP responses,
+# the MCP log, the plan) belongs to one turn and is set again by the next message.
+SESSION_CHANNELS = ("history", "_session_results")
+
+
+# One lock per session thread, held by a message for its run and compaction (see _session_run). Locks
+# of idle sessions are dropped with their last user.
+_thread_locks = weakref.WeakValueDictionary()
+
+
+def thread_lock(thread_id: str) -> asyncio.Lock:
+    lock = _thread_locks.get(thread_id)
+    if lock is None:
+        lock = _thread_locks[thread_id] = asyncio.Lock()
+    return lock
+
+
+# Drop the per-turn channels of a thread's latest checkpoint, then every older checkpoint, so a session
+# costs one small checkpoint however long it runs and however large its last results were. The latest
+# checkpoint is rewritten in place before anything is deleted: a crash in between leaves the session
+# with its full checkpoint, and the next compaction prunes what is left.
+async def compact_thread(saver, thread_id: str):
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    latest = await saver.aget_tuple(config)
+    if latest is None:
+        return
+    values = latest.checkpoint["channel_values"]
+    checkpoint = {**latest.checkpoint, "channel_values": {key: values[key] for key in SESSION_CHANNELS if key in values}}
+    await saver.aput(config, checkpoint, latest.metadata, checkpoint["channel_versions"])
+    await prune_thread(saver, thread_id, checkpoint)
+
+
+# Delete a thread's checkpoints other than the given one, and its pending writes, in one transaction
+async def prune_thread(saver, thread_id: str, checkpoint: dict):
+    if hasattr(saver, "conn"):
+        # AsyncSqliteSaver
+        async with saver.lock, saver.conn.cursor() as cur:
+            await cur.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id != ?", (thread_id, checkpoint["id"]))
+            await cur.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            await saver.conn.commit()
+        return
+    # InMemorySaver keeps channel values apart from the checkpoint, as blobs keyed by channel version
+    for checkpoints in saver.storage.get(thread_id, {}).values():
+        for checkpoint_id in [key for key in checkpoints if key != checkpoint["id"]]:
+            del checkpoints[checkpoint_id]
+    keep = {(channel, checkpoint["channel_versions"].get(channel)) for channel in checkpoint["channel_values"]}
+    for key in [key for key in saver.blobs if key[0] == thread_id and (key[2], key[3]) not in keep]:
+        del saver.blobs[key]
+    for key in [key for key in saver.writes if key[0] == thread_id]:
+        del saver.writes[key]
+
+
+# Reducer for the session history: append the new turns, keep the last SESSION_HISTORY_TURNS
+def bounded_history(history: list, turns: list) -> list:
+    return ((history or []) + (turns or []))[-SESSION_HISTORY_TURNS:]
+
+
+# Reducer for the session results: merge, keep the SESSION_MAX_RESULTS most recent
+def bounded_results(results: dict, update: dict) -> dict:
+    merged = {**(results or {}), **(update or {})}
+    keep = sorted(merged, key=lambda key: merged[key]["at"])[-SESSION_MAX_RESULTS:]
+    return {key: merged[key] for key in keep}
+
+
+def result_key(tool_name: str, arguments: dict) -> str:
+    return f"{tool_name}:{json.dumps(arguments or {}, sort_keys=True)}"
+
+
+# Export handles report the progress of a running job, so a follow-up always asks the server again
+NOT_REUSABLE = ("export_salesforce_records",)
+
+
+# A stored result, unless it is older than SESSION_RESULT_TTL
+def reusable_result(results: dict, tool_name: str, arguments: dict):
+    if tool_name in NOT_REUSABLE:
+        return None
+    entry = (results or {}).get(result_key(tool_name, arguments))
+    if entry is None or time.time() - entry["at"] > SESSION_RESULT_TTL:
+        return None
+    return entry["response"]
+
+
+# Session history as planner context: one line per earlier turn
+def history_context(history: list) -> str:
+    lines = []
+    for turn in history or []:
+        tools = ", ".join(f"{step['tool']}({json.dumps(step['arguments'] or {})})" for step in turn["tools"]) or "none"
+        lines.append(f"- Q: {turn['prompt']} | tools: {tools} | A: {turn['answer']}")
+    return "\n".join(lines)
+
+
+def history_turn(prompt: str, plan: list, answer: str) -> dict:
+    return {"prompt": prompt, "tools": plan or [], "answer": (answer or "")[:SESSION_ANSWER_CHARS]}
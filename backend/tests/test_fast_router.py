@@ -0,0 +1,56 @@
+# Regression cases for the fast-path router: prompts it must route locally, and prompts that must go to the LLM
+import os
+import sys
+import asyncio
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BACKEND, os.path.dirname(BACKEND)]
+import fast_router
+
+OBJECTS = ["Account", "Contact", "Lead", "Case", "Opportunity", "OpportunityLineItem", "Task"]
+
+
+@pytest.fixture(autouse=True)
+def org_objects(monkeypatch):
+    async def salesforce_objects():
+        return OBJECTS
+    monkeypatch.setattr(fast_router, "salesforce_objects", salesforce_objects)
+    monkeypatch.setattr(fast_router, "classifier", None)
+
+
+def route(prompt: str):
+    return asyncio.run(fast_router.fast_route(prompt))
+
+
+@pytest.mark.parametrize("prompt, expected", [
+    ("Describe the Account object", [("describe_salesforce_object", "Account")]),
+    ("describe Account and Contact", [("describe_salesforce_object", "Account"), ("describe_salesforce_object", "Contact")]),
+    ("what fields does the opportunity line items object have", [("describe_salesforce_object", "OpportunityLineItem")]),
+    ("List the fields of Lead", [("describe_salesforce_object", "Lead")]),
+    ("fields of Account, Contact & the Lead", [("describe_salesforce_object", "Account"), ("describe_salesforce_object", "Contact"),
+                                              ("describe_salesforce_object", "Lead")]),
+    ("Which objects exist in my org?", [("list_salesforce_objects", None)]),
+])
+def test_routes_locally(prompt, expected):
+    plan, confidence, _ = route(prompt)
+    assert plan is not None and confidence >= fast_router.FAST_ROUTER_THRESHOLD
+    assert [(step["tool"], step["arguments"].get("object_name")) for step in plan] == expected
+
+
+@pytest.mark.parametrize("prompt", [
+    # Questions about records that mention a field
+    "Which accounts have an empty phone field?",
+    "Show me the Industry field for Acme account",
+    "What is the Status field of case 123?",
+    "Which cases have the priority field set to High",
+    "Show the fields of account 001000000000001AAA",
+    # Several intents, or objects named apart
+    "Describe the Account object and show its records",
+    "the structure of an Opportunity? I want to create a Task",
+    "account address fields",
+    "How many accounts do we have?",
+])
+def test_goes_to_llm(prompt):
+    plan, _, _ = route(prompt)
+    assert plan is None
@@ -0,0 +1,103 @@
+# Fake Gemini backend for benchmarks
+# Replaces google.generativeai.GenerativeModel with a stand-in that answers with canned outputs after
+# a configurable delay, so the orchestrator can be load-tested without spending Gemini quota.
+import os
+import json
+import asyncio
+import types
+
+# Simulated latency per Gemini call (seconds) and per streamed chunk
+FAKE_GEMINI_LATENCY = float(os.getenv("FAKE_GEMINI_LATENCY", "0.2"))
+FAKE_GEMINI_CHUNK_LATENCY = float(os.getenv("FAKE_GEMINI_CHUNK_LATENCY", "0.01"))
+# Optional JSON file with canned routes: [{"keyword": "...", "tool": "...", "arguments": {...}}]
+FAKE_GEMINI_CANNED = os.getenv("FAKE_GEMINI_CANNED")
+
+DEFAULT_CANNED = [
+    {"keyword": "export", "tool": "export_salesforce_records", "arguments": {"query": "SELECT Id, Name, Industry, AnnualRevenue FROM Account"}},
+    {"keyword": "describe", "tool": "describe_salesforce_object", "arguments": {"object_name": "Account"}},
+    {"keyword": "fields", "tool": "describe_salesforce_object", "arguments": {"object_name": "Account"}},
+    {"keyword": "objects", "tool": "list_salesforce_objects", "arguments": {}},
+    {"keyword": "how many", "tool": "query_salesforce_records", "arguments": {"query": "SELECT Id, Name, Industry FROM Account"}},
+    {"keyword": "show", "tool": "query_salesforce_records", "arguments": {"query": "SELECT Id, Name, Industry FROM Account"}},
+]
+
+
+def _load_canned() -> list:
+    if FAKE_GEMINI_CANNED:
+        with open(FAKE_GEMINI_CANNED) as f:
+            return json.load(f)
+    return DEFAULT_CANNED
+
+
+def _user_request(prompt: str) -> str:
+    for marker in ("User request:", "Request:"):
+        if marker in prompt:
+            return prompt.split(marker, 1)[1].split("\n", 1)[0].lower()
+    return prompt.lower()
+
+
+class _Response:
+    def __init__(self, text: str = "", function_calls=(), prompt: str = ""):
+        self.text = text
+        parts = [types.SimpleNamespace(text="", function_call=call) for call in function_calls]
+        parts = parts or [types.SimpleNamespace(text=text, function_call=None)]
+        self.candidates = [types.SimpleNamespace(text=text, content=types.SimpleNamespace(parts=parts))]
+        self.usage_metadata = types.SimpleNamespace(
+            prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4
+        )
+
+
+class FakeGenerativeModel:
+    canned = _load_canned()
+
+    def __init__(self, model_name: str = None, tools=None, **kwargs):
+        self.model_name = model_name
+        self.tools = tools
+
+    def _matches(self, prompt: str) -> list:
+        request = _user_request(prompt)
+        return [rule for rule in self.canned if rule["keyword"] in request]
+
+    def _match(self, prompt: str):
+        matches = self._matches(prompt)
+        return matches[0] if matches else None
+
+    def _answer(self, prompt: str) -> _Response:
+        if "JSON:" in prompt:
+            # Summarization: echo a short, deterministic summary of the payload size
+            return _Response(f"The response contains {len(prompt)} characters of Salesforce data. " * 3, prompt=prompt)
+        rule = self._match(prompt)
+        if self.tools:
+            # Function calling: one parallel function call per matching rule
+            calls = [types.SimpleNamespace(name=r["tool"], args=r["arguments"]) for r in self._matches(prompt)]
+            return _Response("" if calls else "failback", function_calls=calls, prompt=prompt)
+        if "decide which tool" in prompt:
+            return _Response(rule["tool"] if rule else "failback", prompt=prompt)
+        if "SOQL" in prompt:
+            return _Response((rule or DEFAULT_CANNED[4])["arguments"].get("query", "SELECT Id FROM Account"), prompt=prompt)
+        return _Response((rule or DEFAULT_CANNED[1])["arguments"].get("object_name", "Account"), prompt=prompt)
+
+    async def generate_content_async(self, prompt, stream: bool = False, **kwargs):
+        await asyncio.sleep(FAKE_GEMINI_LATENCY)
+        response = self._answer(prompt)
+        if not stream:
+            return response
+        return self._stream(response)
+
+    async def _stream(self, response: _Response):
+        words = response.text.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(FAKE_GEMINI_CHUNK_LATENCY)
+            chunk = types.SimpleNamespace(text=word + (" " if i < len(words) - 1 else ""), usage_metadata=None)
+            if i == len(words) - 1:
+                chunk.usage_metadata = response.usage_metadata
+            yield chunk
+
+    def generate_content(self, prompt, **kwargs):
+        return self._answer(prompt)
+
+
+# Patch google.generativeai so every GenerativeModel created by gemini_llm is the fake
+def install():
+    import google.generativeai as genai
+    genai.GenerativeModel = FakeGenerativeModel
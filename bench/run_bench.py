@@ -0,0 +1,233 @@
+# Load-test and latency benchmark for the chat stack, using local stand-ins only
+# Starts the stub Salesforce server, the MCP server (pointed at the stub) and the orchestrator (with
+# the fake Gemini backend), drives /chat and /tools/call at a fixed concurrency, and reports latency
+# percentiles, throughput and a per-node breakdown scraped from /metrics. Results can be saved as a
+# baseline and compared against one to catch regressions.
+#
+#   python bench/run_bench.py --requests 200 --concurrency 20 --save-baseline bench/baselines/local.json
+#   python bench/run_bench.py --requests 200 --concurrency 20 --compare bench/baselines/local.json
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+from collections import defaultdict
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH = os.path.join(ROOT, "bench")
+
+CHAT_PROMPTS = [
+    "How many accounts do we have?",
+    "Describe the Account object",
+    "Which objects exist in my org?",
+    "Show accounts in the technology industry",
+    "Describe the Account object and show its records",
+]
+TOOL_CALLS = [
+    {"name": "list_salesforce_objects", "arguments": {}},
+    {"name": "describe_salesforce_object", "arguments": {"object_name": "Account"}},
+    {"name": "query_salesforce_records", "arguments": {"query": "SELECT Id, Name FROM Account"}},
+]
+
+_SERIES = re.compile(r'^(\w+)\{([^}]*)\} ([0-9.eE+-]+)$')
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+# Sum (count, sum) of a histogram per value of one label from Prometheus text
+def histogram_totals(text: str, name: str, label: str) -> dict:
+    totals = defaultdict(lambda: [0.0, 0.0])
+    for line in text.splitlines():
+        match = _SERIES.match(line)
+        if not match or match.group(1) not in (f"{name}_sum", f"{name}_count"):
+            continue
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2)))
+        slot = 0 if match.group(1).endswith("_count") else 1
+        totals[labels.get(label, "")][slot] += float(match.group(3))
+    return totals
+
+
+# Mean wall time per label value between two /metrics scrapes
+def breakdown(before: str, after: str, name: str, label: str) -> dict:
+    start, end = histogram_totals(before, name, label), histogram_totals(after, name, label)
+    result = {}
+    for key, (count, total) in end.items():
+        count -= start.get(key, [0, 0])[0]
+        total -= start.get(key, [0, 0])[1]
+        if count:
+            result[key] = {"count": int(count), "mean_ms": total / count * 1000}
+    return result
+
+
+def start_process(args: list, cwd: str, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(args, cwd=cwd, env={**os.environ, **env},
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_until_up(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+# Send `total` requests with at most `concurrency` in flight; returns per-request latencies and errors
+async def drive(client: httpx.AsyncClient, total: int, concurrency: int, make_request) -> dict:
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                resp = await make_request(client, i)
+                resp.raise_for_status()
+                if "error" in resp.json():
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "errors": errors,
+        "concurrency": concurrency,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+async def run(args) -> dict:
+    backend_url = f"http://127.0.0.1:{args.backend_port}"
+    mcp_url = f"http://127.0.0.1:{args.mcp_port}"
+    env = {
+        "LOG_LEVEL": "WARNING",
+        "SALESFORCE_DOMAIN": f"http://127.0.0.1:{args.salesforce_port}",
+        "SALESFORCE_VERSION": "v64.0",
+        "SALESFORCE_ACCESS_TOKEN": "bench",
+        "MCP_BASE_URL": mcp_url,
+        "GEMINI_API_KEY": "bench",
+        "STUB_SALESFORCE_PORT": str(args.salesforce_port),
+        "BENCH_BACKEND_PORT": str(args.backend_port),
+    }
+    processes = [
+        start_process([sys.executable, os.path.join(BENCH, "stub_salesforce.py")], BENCH, env),
+        start_process([sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.mcp_port), "--log-level", "warning"],
+                      os.path.join(ROOT, "mcpsalesforce"), env),
+        start_process([sys.executable, os.path.join(BENCH, "serve_backend.py")], BENCH, env),
+    ]
+    try:
+        for url in (f"http://127.0.0.1:{args.salesforce_port}/docs", f"{mcp_url}/tools", f"{backend_url}/metrics"):
+            await wait_until_up(url)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+            results = {}
+            # /tools/call straight against the MCP server
+            before = (await client.get(f"{mcp_url}/metrics")).text
+            results["tools_call"] = await drive(client, args.requests, args.concurrency, lambda c, i: c.post(
+                f"{mcp_url}/tools/call", json={"jsonrpc": "2.0", "method": "call", "params": TOOL_CALLS[i % len(TOOL_CALLS)], "id": i}))
+            after = (await client.get(f"{mcp_url}/metrics")).text
+            results["tools_call"]["per_tool"] = breakdown(before, after, "mcp_tool_duration_seconds", "tool")
+            # /chat through the whole graph
+            before = (await client.get(f"{backend_url}/metrics")).text
+            results["chat"] = await drive(client, args.requests, args.concurrency, lambda c, i: c.post(
+                f"{backend_url}/chat", json={"message": CHAT_PROMPTS[i % len(CHAT_PROMPTS)]}))
+            after = (await client.get(f"{backend_url}/metrics")).text
+            results["chat"]["per_node"] = breakdown(before, after, "langgraph_node_duration_seconds", "node")
+            results["chat"]["per_gemini_call"] = breakdown(before, after, "gemini_request_duration_seconds", "kind")
+            results["chat"]["per_mcp_call"] = breakdown(before, after, "mcp_request_duration_seconds", "operation")
+            results["chat"]["router"] = (await client.get(f"{backend_url}/router/stats")).json()
+            return results
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+def print_report(results: dict):
+    for name, result in results.items():
+        print(f"\n== {name}: {result['requests']} requests, concurrency {result['concurrency']}, {result['errors']} errors")
+        print(f"   {result['rps']:.1f} req/s   p50 {result['p50_ms']:.1f} ms   p95 {result['p95_ms']:.1f} ms   p99 {result['p99_ms']:.1f} ms")
+        for section in ("per_tool", "per_node", "per_gemini_call", "per_mcp_call"):
+            for key, stats in sorted(result.get(section, {}).items()):
+                print(f"   {section[4:]:<12} {key:<30} {stats['count']:>6}x  mean {stats['mean_ms']:.1f} ms")
+        router = result.get("router")
+        if router:
+            accuracy = f"{router['accuracy']:.0%}" if router["accuracy"] is not None else "n/a"
+            print(f"   fast path    {router['fast_path_rate']:.0%} of {router['decisions']:.0f} messages, "
+                  f"accuracy {accuracy} over {router['shadow_checks']:.0f} shadow checks")
+
+
+# Latency metrics may not grow, and throughput may not shrink, by more than `tolerance`
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if base[metric] and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {result[metric]:.1f} > baseline {base[metric]:.1f}")
+        if base["rps"] and result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}.rps: {result['rps']:.1f} < baseline {base['rps']:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--backend-port", type=int, default=18000)
+    parser.add_argument("--mcp-port", type=int, default=18010)
+    parser.add_argument("--salesforce-port", type=int, default=18020)
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against this baseline JSON file; exits 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (default 0.2)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_report(results)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args), "results": results}, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
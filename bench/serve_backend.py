@@ -0,0 +1,16 @@
+# Run the orchestrator with the fake Gemini backend installed (used by run_bench.py)
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_gemini
+
+fake_gemini.install()
+
+import uvicorn
+from main import app
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("BENCH_BACKEND_PORT", "8000")), log_level="warning")
@@ -0,0 +1,126 @@
+# Cold-start benchmark for the orchestrator, using local stand-ins only
+# Starts the stub Salesforce server and the MCP server once, then measures over several runs how long a
+# fresh orchestrator process takes to import main, to accept connections and to report ready on /ready
+# (graph compiled, Gemini SDK loaded, checkpointer open, tool catalog and sObject list cached).
+#
+#   python bench/startup_bench.py --runs 5
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import tempfile
+import httpx
+from run_bench import ROOT, BENCH, percentile, start_process, wait_until_up
+
+BACKEND = os.path.join(ROOT, "backend")
+IMPORT_SCRIPT = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+
+# Seconds to import the orchestrator's main module in a fresh interpreter
+def import_time(env: dict) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=BACKEND, env={**os.environ, **env},
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+# Seconds from spawning the orchestrator until it accepts connections and until /ready returns 200
+async def boot_times(env: dict, port: int, timeout: float = 60) -> dict:
+    started = time.perf_counter()
+    process = start_process([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                            BACKEND, env)
+    try:
+        url = f"http://127.0.0.1:{port}/ready"
+        await wait_until_up(url, timeout)
+        listening = time.perf_counter() - started
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient() as client:
+            while True:
+                resp = await client.get(url)
+                if resp.status_code == 200:
+                    return {"listening": listening, "ready": time.perf_counter() - started, "steps": resp.json()["steps"]}
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{url} not ready within {timeout}s: {resp.text}")
+                await asyncio.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+async def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    env = {
+        "LOG_LEVEL": "WARNING",
+        "SALESFORCE_DOMAIN": f"http://127.0.0.1:{args.salesforce_port}",
+        "SALESFORCE_VERSION": "v64.0",
+        "SALESFORCE_ACCESS_TOKEN": "bench",
+        "MCP_BASE_URL": f"http://127.0.0.1:{args.mcp_port}",
+        "GEMINI_API_KEY": "bench",
+        "STUB_SALESFORCE_PORT": str(args.salesforce_port),
+        "CHECKPOINT_DB": os.path.join(workdir, "checkpoints.sqlite"),
+    }
+    processes = [
+        start_process([sys.executable, os.path.join(BENCH, "stub_salesforce.py")], BENCH, env),
+        start_process([sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.mcp_port), "--log-level", "warning"],
+                      os.path.join(ROOT, "mcpsalesforce"), env),
+    ]
+    try:
+        for url in (f"http://127.0.0.1:{args.salesforce_port}/docs", f"http://127.0.0.1:{args.mcp_port}/tools"):
+            await wait_until_up(url)
+        imports, listening, ready, steps = [], [], [], {}
+        for _ in range(args.runs):
+            imports.append(await asyncio.to_thread(import_time, env))
+            boot = await boot_times(env, args.backend_port)
+            listening.append(boot["listening"])
+            ready.append(boot["ready"])
+            for step, info in boot["steps"].items():
+                steps.setdefault(step, []).append(info.get("seconds", 0.0))
+        return {
+            "runs": args.runs,
+            "import": summarize(imports),
+            "listening": summarize(listening),
+            "ready": summarize(ready),
+            "steps": {step: summarize(values) for step, values in steps.items()},
+        }
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+def summarize(values: list) -> dict:
+    return {"p50_ms": percentile(values, 50) * 1000, "max_ms": max(values) * 1000}
+
+
+def print_report(results: dict):
+    print(f"\n== orchestrator cold start, {results['runs']} runs")
+    for name in ("import", "listening", "ready"):
+        stats = results[name]
+        print(f"   {name:<12} p50 {stats['p50_ms']:.0f} ms   max {stats['max_ms']:.0f} ms")
+    for step, stats in sorted(results["steps"].items()):
+        print(f"   warmup       {step:<12} p50 {stats['p50_ms']:.0f} ms   max {stats['max_ms']:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--backend-port", type=int, default=18030)
+    parser.add_argument("--mcp-port", type=int, default=18010)
+    parser.add_argument("--salesforce-port", type=int, default=18020)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_report(results)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args), "results": results}, f, indent=2)
+        print(f"\nResults saved to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# Stub Salesforce REST server for benchmarks
+# Serves the endpoints used by mcpsalesforce/functions.py (sObject list, describe, paginated SOQL
+# queries, Composite Batch, Bulk API 2.0 query jobs) with synthetic data and a configurable latency. Point the MCP server at it with
+# SALESFORCE_DOMAIN=http://127.0.0.1:<port>.
+import os
+import json
+import asyncio
+import random
+import time
+import uuid
+import urllib.parse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+STUB_LATENCY = float(os.getenv("STUB_SALESFORCE_LATENCY", "0.05"))
+STUB_RECORDS = int(os.getenv("STUB_SALESFORCE_RECORDS", "500"))
+STUB_PAGE_SIZE = int(os.getenv("STUB_SALESFORCE_PAGE_SIZE", "2000"))
+STUB_FIELDS = int(os.getenv("STUB_SALESFORCE_FIELDS", "60"))
+# Bulk API 2.0 query jobs: rows per job and seconds until a job is complete
+STUB_BULK_RECORDS = int(os.getenv("STUB_SALESFORCE_BULK_RECORDS", "100000"))
+STUB_BULK_DELAY = float(os.getenv("STUB_SALESFORCE_BULK_DELAY", "1"))
+# Fraction of requests answered with 503 to exercise the retry path
+STUB_ERROR_RATE = float(os.getenv("STUB_SALESFORCE_ERROR_RATE", "0"))
+
+OBJECTS = ["Account", "Contact", "Opportunity", "Case", "Lead", "User"]
+INDUSTRIES = ["Technology", "Finance", "Retail", "Energy"]
+
+app = FastAPI()
+
+
+@app.middleware("http")
+async def simulate_latency(request: Request, call_next):
+    await asyncio.sleep(STUB_LATENCY)
+    if STUB_ERROR_RATE and random.random() < STUB_ERROR_RATE:
+        return JSONResponse(status_code=503, content=[{"errorCode": "SERVER_UNAVAILABLE", "message": "stub"}])
+    return await call_next(request)
+
+
+def _record(object_name: str, i: int) -> dict:
+    return {
+        "attributes": {"type": object_name, "url": f"/services/data/v64.0/sobjects/{object_name}/001{i:015d}"},
+        "Id": f"001{i:015d}",
+        "Name": f"{object_name} {i}",
+        "Industry": INDUSTRIES[i % len(INDUSTRIES)],
+        "AnnualRevenue": i * 1000,
+    }
+
+
+@app.get("/services/data/{version}/sobjects/")
+async def sobjects(version: str):
+    return {"sobjects": [{"name": name, "label": name} for name in OBJECTS]}
+
+
+@app.get("/services/data/{version}/sobjects/{object_name}/describe/")
+async def describe(version: str, object_name: str):
+    if object_name not in OBJECTS:
+        return JSONResponse(status_code=404, content=[{"errorCode": "NOT_FOUND", "message": f"sObject type '{object_name}' is not supported."}])
+    fields = [
+        {"name": "Id", "type": "id", "label": "Record ID"},
+        {"name": "Name", "type": "string", "label": "Name"},
+        {"name": "Industry", "type": "picklist", "label": "Industry",
+         "picklistValues": [{"value": v, "active": True} for v in INDUSTRIES]},
+        {"name": "AnnualRevenue", "type": "currency", "label": "Annual Revenue"},
+        {"name": "OwnerId", "type": "reference", "label": "Owner ID", "referenceTo": ["User"], "relationshipName": "Owner"},
+    ]
+    fields += [{"name": f"Custom_{i}__c", "type": "string", "label": f"Custom {i}"} for i in range(STUB_FIELDS)]
+    return {"name": object_name, "fields": fields}
+
+
+def _page(object_name: str, locator: str, offset: int, page_size: int, version: str) -> dict:
+    end = min(offset + page_size, STUB_RECORDS)
+    page = {
+        "totalSize": STUB_RECORDS,
+        "done": end >= STUB_RECORDS,
+        "records": [_record(object_name, i) for i in range(offset, end)],
+    }
+    if not page["done"]:
+        page["nextRecordsUrl"] = f"/services/data/{version}/query/{locator}-{end}"
+    return page
+
+
+def _page_size(request: Request) -> int:
+    options = request.headers.get("Sforce-Query-Options", "")
+    if options.startswith("batchSize="):
+        return int(options.split("=", 1)[1])
+    return STUB_PAGE_SIZE
+
+
+@app.get("/services/data/{version}/query/")
+async def query(version: str, q: str, request: Request):
+    words = q.split()
+    upper = [w.upper() for w in words]
+    object_name = words[upper.index("FROM") + 1] if "FROM" in upper else "Account"
+    page_size = _page_size(request)
+    return _page(object_name, f"01g{object_name}.{page_size}", 0, page_size, version)
+
+
+@app.get("/services/data/{version}/query/{cursor}")
+async def query_more(version: str, cursor: str):
+    locator, _, offset = cursor.rpartition("-")
+    object_name, _, page_size = locator[3:].partition(".")
+    return _page(object_name, locator, int(offset), int(page_size or STUB_PAGE_SIZE), version)
+
+
+# Composite Batch: subrequest URLs are relative to /services/data/ (e.g. v64.0/sobjects/Account/describe/)
+@app.post("/services/data/{version}/composite/batch")
+async def composite_batch(version: str, request: Request):
+    body = await request.json()
+    results = []
+    for sub in body.get("batchRequests", []):
+        url = urllib.parse.urlsplit(sub["url"])
+        parts = url.path.strip("/").split("/")
+        if parts[1:2] == ["sobjects"] and parts[-1] == "describe":
+            response = await describe(parts[0], parts[2])
+        elif parts[1:] == ["query"]:
+            q = urllib.parse.parse_qs(url.query).get("q", [""])[0]
+            response = await query(parts[0], q, request)
+        else:
+            response = JSONResponse(status_code=404, content=[{"errorCode": "NOT_FOUND", "message": sub["url"]}])
+        if isinstance(response, JSONResponse):
+            results.append({"statusCode": response.status_code, "result": json.loads(response.body)})
+        else:
+            results.append({"statusCode": 200, "result": response})
+    return {"hasErrors": any(r["statusCode"] >= 400 for r in results), "results": results}
+
+
+JOBS = {}  # job id -> {"object", "created"}
+
+
+def _query_object(q: str) -> str:
+    words = q.split()
+    upper = [w.upper() for w in words]
+    return words[upper.index("FROM") + 1] if "FROM" in upper else "Account"
+
+
+@app.post("/services/data/{version}/jobs/query")
+async def create_bulk_job(version: str, request: Request):
+    body = await request.json()
+    job_id = "750" + uuid.uuid4().hex[:15]
+    JOBS[job_id] = {"object": _query_object(body["query"]), "created": time.monotonic()}
+    return {"id": job_id, "operation": "query", "object": JOBS[job_id]["object"], "state": "UploadComplete"}
+
+
+@app.get("/services/data/{version}/jobs/query/{job_id}")
+async def bulk_job(version: str, job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content=[{"errorCode": "NOT_FOUND", "message": "Job not found"}])
+    done = time.monotonic() - job["created"] >= STUB_BULK_DELAY
+    return {"id": job_id, "state": "JobComplete" if done else "InProgress",
+            "numberRecordsProcessed": STUB_BULK_RECORDS if done else 0}
+
+
+# Results as CSV, maxRecords rows at a time; Sforce-Locator is the next offset or "null"
+@app.get("/services/data/{version}/jobs/query/{job_id}/results")
+async def bulk_results(version: str, job_id: str, maxRecords: int = 50000, locator: str = None):
+    job = JOBS[job_id]
+    offset = int(locator or 0)
+    end = min(offset + maxRecords, STUB_BULK_RECORDS)
+    lines = ['"Id","Name","Industry","AnnualRevenue"']
+    for i in range(offset, end):
+        record = _record(job["object"], i)
+        lines.append(f'"{record["Id"]}","{record["Name"]}","{record["Industry"]}","{record["AnnualRevenue"]}"')
+    headers = {"Sforce-Locator": str(end) if end < STUB_BULK_RECORDS else "null", "Sforce-NumberOfRecords": str(end - offset)}
+    return Response("\n".join(lines) + "\n", media_type="text/csv", headers=headers)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("STUB_SALESFORCE_PORT", "8020")), log_level="warning")
@@ -0,0 +1 @@
+# Code shared by the orchestrator (backend/) and the MCP server (mcpsalesforce/)
@@ -0,0 +1,241 @@
+# Metadata cache with TTL expiry and size-bounded LRU eviction
+# With several workers, CACHE_BACKEND points every TTLCache at a store they share, so each entry is
+# fetched once for all workers: "sqlite:<path>" (one file on the host) or "redis://host:6379/0"
+# (any Redis-compatible server, needs the redis package). The default, "memory", keeps entries in
+# the process, which is also the fallback when the shared store cannot be opened.
+# Shared store lookups do I/O (a local SQLite read, typically well under a millisecond, or a Redis round
+# trip bounded by a 1 s socket timeout), so request handlers use the async methods (aget, aset), which
+# run them in a worker thread instead of on the event loop.
+import os
+import json
+import math
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+logger = logging.getLogger("cache")
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+
+
+# Shared store in a SQLite file (WAL mode, so readers in other workers do not block on writers).
+# Calls come from worker threads, so they take turns on the one connection. Reads record when an
+# entry was last used, so a full namespace evicts its least recently used entries, as in memory.
+class SQLiteStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, expires_at REAL, value TEXT, accessed_at REAL DEFAULT 0,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        try:
+            # Files created before entries recorded their last use
+            self._conn.execute("ALTER TABLE cache ADD COLUMN accessed_at REAL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass
+
+    def get(self, namespace: str, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?", (namespace, key, now)
+            ).fetchone()
+            if row:
+                self._conn.execute("UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+        return json.loads(row[0]) if row else None
+
+    # Returns how many entries were evicted to stay within max_size (least recently used first)
+    def set(self, namespace: str, key: str, value: Any, ttl: float, max_size: int = None) -> int:
+        with self._lock:
+            return self._set(namespace, key, value, ttl, max_size)
+
+    def _set(self, namespace: str, key: str, value: Any, ttl: float, max_size: int = None) -> int:
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, expires_at, value, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, now + ttl, json.dumps(value, default=str), now),
+        )
+        self._conn.execute("DELETE FROM cache WHERE namespace = ? AND expires_at <= ?", (namespace, now))
+        if not max_size:
+            return 0
+        excess = self.size(namespace) - max_size
+        if excess <= 0:
+            return 0
+        self._conn.execute(
+            "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache WHERE namespace = ? ORDER BY accessed_at LIMIT ?)",
+            (namespace, excess),
+        )
+        return excess
+
+    def delete(self, namespace: str, key: str) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key)).rowcount
+
+    # Drop every entry of a namespace, or only the keys starting with `prefix`
+    def clear(self, namespace: str, prefix: str = "") -> int:
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND substr(key, 1, ?) = ?", (namespace, len(prefix), prefix)
+            ).rowcount
+
+    def size(self, namespace: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ? AND expires_at > ?", (namespace, time.time())
+            ).fetchone()[0]
+
+
+# Shared store on a Redis-compatible server; expiry is Redis' own, size limits are its maxmemory policy
+class RedisStore:
+    def __init__(self, url: str):
+        import redis
+        self.path = url
+        self._redis = redis.Redis.from_url(url, socket_timeout=1)
+        self._redis.ping()
+
+    @staticmethod
+    def _key(namespace: str, key: str) -> str:
+        return f"cache:{namespace}:{key}"
+
+    def get(self, namespace: str, key: str):
+        value = self._redis.get(self._key(namespace, key))
+        return json.loads(value) if value is not None else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float, max_size: int = None) -> int:
+        self._redis.set(self._key(namespace, key), json.dumps(value, default=str), ex=max(1, math.ceil(ttl)))
+        return 0
+
+    def delete(self, namespace: str, key: str) -> int:
+        return self._redis.delete(self._key(namespace, key))
+
+    def clear(self, namespace: str, prefix: str = "") -> int:
+        pattern = self._key(namespace, "".join(f"\\{c}" if c in "*?[]\\" else c for c in prefix)) + "*"
+        count = 0
+        batch = []
+        for key in self._redis.scan_iter(match=pattern, count=500):
+            batch.append(key)
+            if len(batch) == 500:
+                count += self._redis.delete(*batch)
+                batch = []
+        if batch:
+            count += self._redis.delete(*batch)
+        return count
+
+    def size(self, namespace: str) -> int:
+        return sum(1 for _ in self._redis.scan_iter(match=self._key(namespace, "*"), count=500))
+
+
+# Open the store named by a CACHE_BACKEND value; None means in-process caches
+def make_store(spec: str):
+    spec = (spec or "memory").strip()
+    try:
+        if spec.startswith("sqlite:"):
+            return SQLiteStore(spec[len("sqlite:"):])
+        if spec.startswith(("redis://", "rediss://", "unix://")):
+            return RedisStore(spec)
+    except Exception as e:
+        logger.warning("Shared cache %s unavailable, using in-process caches: %s", spec, e)
+        return None
+    if spec != "memory":
+        logger.warning("Unknown CACHE_BACKEND %s, using in-process caches", spec)
+    return None
+
+
+shared_store = make_store(CACHE_BACKEND)
+
+
+class TTLCache:
+    # `shared=False` keeps the cache in-process even when a shared store is configured
+    # (for values that cannot be serialized to JSON)
+    def __init__(self, name: str, max_size: int = 256, ttl: float = 3600, shared: bool = True):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._store = shared_store if shared else None
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Return the cached value or `default`; expired entries count as misses
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if self._store is not None:
+            value = self._shared("get", str(key))
+            if value is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        if self._store is not None:
+            self.evictions += self._shared("set", str(key), value, ttl, self.max_size) or 0
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    # Drop one key, or everything when key is None; returns how many entries were removed
+    def invalidate(self, key: Hashable = None) -> int:
+        if self._store is not None:
+            return (self._shared("clear") if key is None else self._shared("delete", str(key))) or 0
+        if key is None:
+            count = len(self._data)
+            self._data.clear()
+            return count
+        return 1 if self._data.pop(key, None) is not None else 0
+
+    # Run a cache operation from async code: in a worker thread when it goes to the shared store,
+    # inline when the cache is in-process (no I/O, so no thread hop)
+    async def offload(self, func, *args):
+        if self._store is None:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    async def aget(self, key: Hashable, default: Any = None) -> Any:
+        return await self.offload(self.get, key, default)
+
+    async def aset(self, key: Hashable, value: Any, ttl: float = None):
+        return await self.offload(self.set, key, value, ttl)
+
+    async def ainvalidate(self, key: Hashable = None) -> int:
+        return await self.offload(self.invalidate, key)
+
+    # A failing shared store degrades to cache misses instead of failing the request
+    def _shared(self, operation: str, *args):
+        try:
+            return getattr(self._store, operation)(self.name, *args)
+        except Exception as e:
+            logger.warning("Shared cache %s %s failed: %s", self.name, operation, e)
+            return None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": (self._shared("size") or 0) if self._store is not None else len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
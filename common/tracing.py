@@ -0,0 +1,149 @@
+# Tracing and Prometheus-style metrics, used by the orchestrator and the MCP server
+# Every HTTP request gets a trace ID (taken from the X-Trace-Id header or generated) that is kept in a
+# context variable and attached to log lines. The orchestrator forwards it to the MCP server (in the
+# header and as the JSON-RPC id), so one chat turn can be followed end to end.
+import time
+import uuid
+import contextvars
+from collections import defaultdict
+
+TRACE_HEADER = "X-Trace-Id"
+trace_id_var = contextvars.ContextVar("trace_id", default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def current_trace_id() -> str:
+    return trace_id_var.get()
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+# Minimal in-process metrics registry rendered in the Prometheus text exposition format
+class Metrics:
+    def __init__(self):
+        self._help = {}
+        self._counters = defaultdict(float)  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._buckets = {}  # name -> bucket bounds
+        self._collectors = []  # callables returning [(name, labels, value)] gauge samples
+
+    def inc(self, name: str, labels: dict = None, value: float = 1, help: str = ""):
+        self._help.setdefault(name, ("counter", help))
+        self._counters[(name, _label_key(labels))] += value
+
+    def observe(self, name: str, labels: dict = None, value: float = 0, buckets=DURATION_BUCKETS, help: str = ""):
+        self._help.setdefault(name, ("histogram", help))
+        bounds = self._buckets.setdefault(name, buckets)
+        key = (name, _label_key(labels))
+        series = self._histograms.get(key)
+        if series is None:
+            series = self._histograms[key] = [0] * (len(bounds) + 2)
+        for i, bound in enumerate(bounds):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    # Register a callable that returns current gauge samples (e.g. cache sizes) at render time
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    # Counter values summed per value of one label (None sums every series of the counter)
+    def counter_totals(self, name: str, label: str = None) -> dict:
+        totals = defaultdict(float)
+        for (metric, labels), value in self._counters.items():
+            if metric == name:
+                totals[dict(labels).get(label, "") if label else ""] += value
+        return dict(totals)
+
+    # Gauge samples of the registered collectors. Collectors may read shared cache stores, so the
+    # /metrics endpoints call this in a worker thread and pass the samples to render().
+    def collect(self) -> list:
+        return [sample for collector in self._collectors for sample in collector()]
+
+    def render(self, samples: list = None) -> str:
+        lines = []
+        names = sorted({name for name, _ in self._counters} | {name for name, _ in self._histograms})
+        for name in names:
+            kind, help_text = self._help[name]
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+                continue
+            for (metric, labels), series in sorted(self._histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(self._buckets[name], series):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {series[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {series[-2]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {series[-1]}")
+        gauges = defaultdict(list)
+        for name, labels, value in self.collect() if samples is None else samples:
+            gauges[name].append((_label_key(labels), value))
+        for name, samples in sorted(gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# Path label of a request: the matched route template (on the orchestrator, DELETE /sessions/abc is
+# labelled "/sessions/{session_id}"), so per-ID URLs and unknown paths do not each add a series to
+# the metrics
+def route_template(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+# Pure ASGI middleware: sets the trace ID for the request, echoes it in the response headers and
+# records the request duration (streamed responses are timed until their last chunk is sent)
+class TraceMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        trace_id = headers.get(TRACE_HEADER.lower().encode(), b"").decode() or new_trace_id()
+        token = trace_id_var.set(trace_id)
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers") or []) + [(TRACE_HEADER.lower().encode(), trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            elapsed = time.perf_counter() - started
+            labels = {"path": route_template(scope), "method": scope.get("method", ""), "status": status["code"]}
+            metrics.observe("http_request_duration_seconds", labels, elapsed, help="Wall time of each HTTP request")
+            trace_id_var.reset(token)
@@ -1,5 +1,4 @@
 import React, { useState, useRef } from "react";
-import axios from "axios";
 
 const MicIcon = () => (
   <svg width="18" height="18" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2" strokeLinecap="round" strokeLinejoin="round" style={{ marginLeft: 6, verticalAlign: 'middle' }}>
@@ -22,17 +21,56 @@ const Chat = () => {
   const recognitionRef = useRef(null);
   // State for MCP server call/response log
   const [mcpLog, setMcpLog] = useState([]);
+  // Session ID: follow-up questions reuse the history and results of this chat
+  const sessionId = useRef(crypto.randomUUID());
 
-  // Send a message to the backend and update chat/mcp log
+  // Replace the text of the last (bot) message while it is being streamed
+  const updateLastMessage = (update) => {
+    setMessages((msgs) => {
+      const last = msgs[msgs.length - 1];
+      return [...msgs.slice(0, -1), { ...last, ...update(last) }];
+    });
+  };
+
+  // Send a message to the backend and render the streamed answer and mcp log incrementally
   const sendMessage = async () => {
     if (!input.trim()) return;
     const userMsg = { sender: "user", text: input };
-    setMessages((msgs) => [...msgs, userMsg]);
+    setMessages((msgs) => [...msgs, userMsg, { sender: "bot", text: "", status: "Thinking..." }]);
+    setMcpLog([]);
     setInput("");
-    // Call backend /chat endpoint
-    const res = await axios.post("http://localhost:8000/chat", { message: input });
-    setMessages((msgs) => [...msgs, { sender: "bot", text: res.data.result }]);
-    setMcpLog(res.data.mcp_log || []);
+    // Call backend /chat/stream endpoint (newline-delimited JSON events)
+    const res = await fetch("http://localhost:8000/chat/stream", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ message: input, session_id: sessionId.current }),
+    });
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    const handleEvent = (event) => {
+      if (event.type === "node") {
+        updateLastMessage(() => ({ status: `Finished ${event.node}...` }));
+      } else if (event.type === "mcp_log") {
+        setMcpLog((log) => [...log, event.entry]);
+      } else if (event.type === "token") {
+        updateLastMessage((last) => ({ text: last.text + event.text, status: null }));
+      } else if (event.type === "done") {
+        updateLastMessage(() => ({ text: event.result, status: null }));
+        setMcpLog(event.mcp_log || []);
+      } else if (event.type === "error") {
+        updateLastMessage(() => ({ text: `Error: ${event.message}`, status: null }));
+      }
+    };
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop();
+      lines.filter((line) => line.trim()).forEach((line) => handleEvent(JSON.parse(line)));
+    }
+    if (buffer.trim()) handleEvent(JSON.parse(buffer));
   };
 
   // Handle Enter key for sending
@@ -94,7 +132,7 @@ const Chat = () => {
                 wordBreak: "break-word",
                 fontSize: 16,
                 boxShadow: msg.sender === "user" ? "0 2px 8px rgba(25, 118, 210, 0.08)" : undefined
-              }}>{msg.text}</span>
+              }}>{msg.text || msg.status}</span>
             </div>
           ))}
         </div>
@@ -136,6 +174,7 @@ const Chat = () => {
           {mcpLog.map((entry, idx) => (
             <div key={idx} style={{ marginBottom: 12, fontSize: 13 }}>
               <b>{entry.type === "call" ? "Call" : "Response"}:</b> <span style={{ color: '#333' }}>{entry.tool}</span>
+              {entry.source === "session" && <span style={{ color: '#888' }}> (reused from session)</span>}
               <pre style={{ background: '#f4f6fb', borderRadius: 6, padding: 8, margin: 0, fontSize: 12, overflowX: 'auto' }}>
                 {JSON.stringify(entry.type === "call" ? entry.payload : entry.response, null, 2)}
               </pre>
@@ -0,0 +1,305 @@
+# Bulk API 2.0 exports for large extracts
+# export_salesforce_records submits a Bulk API 2.0 query job, polls it with backoff and downloads the
+# CSV results chunk by chunk (Sforce-Locator paging) into a local CSV file, or a Parquet file when
+# pyarrow is installed. Only one chunk is held in memory at a time; per-column statistics are
+# collected on the way so the caller gets a summary instead of the rows.
+import os
+import io
+import csv
+import time
+import uuid
+import asyncio
+import logging
+from collections import Counter, OrderedDict
+from typing import Any, Dict
+from common.cache import TTLCache
+from functions import session
+from soql import validate_soql
+
+logger = logging.getLogger("bulk")
+
+BULK_EXPORT_DIR = os.getenv("BULK_EXPORT_DIR", "exports")
+# Rows per downloaded result chunk (Bulk API maxRecords)
+BULK_CHUNK_RECORDS = int(os.getenv("BULK_CHUNK_RECORDS", "50000"))
+# Job polling: first interval, backoff cap and overall timeout (seconds)
+BULK_POLL_INTERVAL = float(os.getenv("BULK_POLL_INTERVAL", "1"))
+BULK_POLL_MAX_INTERVAL = float(os.getenv("BULK_POLL_MAX_INTERVAL", "10"))
+BULK_JOB_TIMEOUT = float(os.getenv("BULK_JOB_TIMEOUT", "1800"))
+# How long a tool call waits for the export before returning its handle (the export continues). Keep
+# it well below the caller's read timeout, or the caller gives up before it gets the export_id.
+BULK_WAIT_SECONDS = float(os.getenv("BULK_WAIT_SECONDS", "20"))
+BULK_MAX_EXPORTS = int(os.getenv("BULK_MAX_EXPORTS", "100"))
+# How long finished handles stay visible to the other workers through the shared cache (seconds)
+BULK_HANDLE_TTL = float(os.getenv("BULK_HANDLE_TTL", "86400"))
+# Columns with more distinct values than this only report their fill rate and numeric range
+BULK_STATS_MAX_DISTINCT = 50
+BULK_STATS_TOP_VALUES = 5
+BULK_SAMPLE_ROWS = 5
+
+FORMATS = ("csv", "parquet")
+
+
+# Running per-column statistics over the exported rows
+class ColumnStats:
+    def __init__(self, columns: list):
+        self.columns = columns
+        self.rows = 0
+        self.filled = Counter()
+        self.values = {column: Counter() for column in columns}
+        self.numeric = {column: [None, None] for column in columns}
+        self.not_numeric = set()
+        self.sample = []
+
+    def add(self, rows: list):
+        for row in rows:
+            self.rows += 1
+            if len(self.sample) < BULK_SAMPLE_ROWS:
+                self.sample.append(row)
+            for column, value in zip(self.columns, row):
+                if value == "":
+                    continue
+                self.filled[column] += 1
+                values = self.values.get(column)
+                if values is not None:
+                    values[value] += 1
+                    if len(values) > BULK_STATS_MAX_DISTINCT:
+                        self.values[column] = None
+                if column not in self.not_numeric:
+                    try:
+                        # Zero-padded codes and IDs are text, not numbers
+                        if len(value) > 1 and value[0] == "0" and value[1] != ".":
+                            raise ValueError(value)
+                        number = float(value)
+                    except ValueError:
+                        self.not_numeric.add(column)
+                        continue
+                    bounds = self.numeric[column]
+                    bounds[0] = number if bounds[0] is None else min(bounds[0], number)
+                    bounds[1] = number if bounds[1] is None else max(bounds[1], number)
+
+    def summary(self) -> dict:
+        columns = {}
+        for column in self.columns:
+            info = {"filled": self.filled[column]}
+            if column not in self.not_numeric and self.numeric[column][0] is not None:
+                info["min"], info["max"] = self.numeric[column]
+            elif self.values[column] is not None:
+                info["distinct"] = len(self.values[column])
+                info["top"] = self.values[column].most_common(BULK_STATS_TOP_VALUES)
+            columns[column] = info
+        return {"records": self.rows, "columns": columns, "sample": {"columns": self.columns, "rows": self.sample}}
+
+
+# Destination file: CSV appends the chunks as they come, Parquet converts each chunk to a row group
+class ExportWriter:
+    def __init__(self, path: str, file_format: str):
+        self.path = path
+        self.format = file_format
+        self._file = None
+        self._parquet = None
+        self._schema = None
+
+    def write(self, header: list, rows: list, raw: bytes, first: bool):
+        if self.format == "csv":
+            if self._file is None:
+                self._file = open(self.path, "wb")
+            # Every chunk repeats the header line; keep only the first one
+            self._file.write(raw if first else raw.split(b"\n", 1)[1] if b"\n" in raw else b"")
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self._parquet is None:
+            # Bulk API results are untyped CSV: every column is stored as a string
+            self._schema = pa.schema([(column, pa.string()) for column in header])
+            self._parquet = pq.ParquetWriter(self.path, self._schema, compression="zstd")
+        columns = list(zip(*rows)) if rows else [[] for _ in header]
+        table = pa.Table.from_arrays([pa.array(list(values), pa.string()) for values in columns], schema=self._schema)
+        self._parquet.write_table(table)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+# One export: its job, progress and result. `to_dict` is what the tool returns as the handle.
+class Export:
+    def __init__(self, query: str, file_format: str):
+        self.export_id = uuid.uuid4().hex
+        self.query = query
+        self.format = file_format
+        self.job_id = None
+        self.state = "Submitting"
+        self.path = None
+        self.bytes = 0
+        self.chunks = 0
+        self.stats = None
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self.task = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        handle = {
+            "export_id": self.export_id,
+            "job_id": self.job_id,
+            "state": self.state,
+            "query": self.query,
+            "format": self.format,
+            "path": self.path,
+            "bytes": self.bytes,
+            "chunks": self.chunks,
+            "duration_seconds": round((self.finished or time.time()) - self.started, 3),
+        }
+        if self.stats is not None:
+            handle["summary"] = self.stats.summary()
+        if self.error:
+            handle["error"] = self.error
+        return handle
+
+
+exports = OrderedDict()  # export_id -> Export (running ones, and the most recent finished ones up to BULK_MAX_EXPORTS)
+# Tasks of the running exports: the event loop only keeps weak references to tasks
+running_tasks = set()
+# Handle snapshots, so a worker that did not start an export can still answer export_id lookups
+export_handles = TTLCache("exports", max_size=BULK_MAX_EXPORTS, ttl=BULK_HANDLE_TTL)
+
+
+async def _publish(export: Export):
+    await export_handles.aset(export.export_id, export.to_dict())
+
+
+async def _wait_for_job(export: Export):
+    interval = BULK_POLL_INTERVAL
+    deadline = time.monotonic() + BULK_JOB_TIMEOUT
+    while True:
+        job = await session.get(f"jobs/query/{export.job_id}")
+        export.state = job.get("state", export.state)
+        if export.state == "JobComplete":
+            return
+        if export.state in ("Failed", "Aborted"):
+            raise RuntimeError(job.get("errorMessage") or f"Bulk job {export.state}")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Bulk job {export.job_id} did not finish in {BULK_JOB_TIMEOUT:.0f}s")
+        await asyncio.sleep(interval)
+        interval = min(interval * 2, BULK_POLL_MAX_INTERVAL)
+
+
+async def _run_export(export: Export):
+    writer = None
+    try:
+        resp = await session.request("POST", "jobs/query", json={"operation": "query", "query": export.query})
+        export.job_id = resp.json()["id"]
+        export.state = resp.json().get("state", "UploadComplete")
+        await _publish(export)
+        await _wait_for_job(export)
+        os.makedirs(BULK_EXPORT_DIR, exist_ok=True)
+        export.path = os.path.abspath(os.path.join(BULK_EXPORT_DIR, f"{export.job_id}.{export.format}"))
+        writer = ExportWriter(export.path, export.format)
+        locator = None
+        export.state = "Downloading"
+        while True:
+            params = {"maxRecords": BULK_CHUNK_RECORDS}
+            if locator:
+                params["locator"] = locator
+            resp = await session.request("GET", f"jobs/query/{export.job_id}/results", params=params)
+            raw = resp.content
+            # Parsing, statistics and file writes run off the event loop
+            header, rows = await asyncio.to_thread(_parse_chunk, raw)
+            if export.stats is None:
+                export.stats = ColumnStats(header)
+            await asyncio.to_thread(_consume_chunk, writer, export.stats, header, rows, raw, export.chunks == 0)
+            export.chunks += 1
+            export.bytes += len(raw)
+            await _publish(export)
+            locator = resp.headers.get("Sforce-Locator")
+            if not locator or locator == "null":
+                break
+        export.state = "Complete"
+    except asyncio.CancelledError:
+        export.state = "Cancelled"
+        export.error = "The MCP server shut down before the export finished"
+        raise
+    except Exception as e:
+        logger.warning("Bulk export %s failed: %s", export.export_id, e)
+        export.state = "Failed"
+        export.error = str(e)
+    finally:
+        if writer is not None:
+            writer.close()
+        # A partial file is of no use to anyone
+        if export.state != "Complete" and export.path:
+            try:
+                os.remove(export.path)
+            except OSError:
+                pass
+            export.path = None
+        export.finished = time.time()
+        await _publish(export)
+
+
+# Forget the oldest finished exports beyond BULK_MAX_EXPORTS; running ones stay until they finish
+def _evict_exports():
+    finished = [export_id for export_id, export in exports.items() if export.finished is not None]
+    for export_id in finished[:max(len(exports) - BULK_MAX_EXPORTS, 0)]:
+        del exports[export_id]
+
+
+# Cancel the running exports (on shutdown); their partial files are removed
+async def cancel_exports():
+    tasks = list(running_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _parse_chunk(raw: bytes):
+    reader = csv.reader(io.StringIO(raw.decode("utf-8")))
+    header = next(reader, [])
+    return header, list(reader)
+
+
+def _consume_chunk(writer: ExportWriter, stats: ColumnStats, header: list, rows: list, raw: bytes, first: bool):
+    writer.write(header, rows, raw, first)
+    stats.add(rows)
+
+
+# Start an export (or look one up by export_id) and wait up to `wait` seconds for it to finish.
+# Returns the export handle: state, file path, size and, once complete, the summary statistics.
+async def export_salesforce_records(query: str = None, file_format: str = "csv", export_id: str = None,
+                                    wait: float = BULK_WAIT_SECONDS) -> Dict[str, Any]:
+    if export_id:
+        export = exports.get(export_id)
+        if export is None:
+            # Started by another worker: its latest snapshot is all this worker knows
+            handle = await export_handles.aget(export_id)
+            if handle is None:
+                raise ValueError(f"Unknown export_id: {export_id}")
+            return handle
+    else:
+        if not query:
+            raise ValueError("Missing required parameter: query")
+        file_format = (file_format or "csv").lower()
+        if file_format not in FORMATS:
+            raise ValueError(f"Unsupported format: {file_format} (expected one of {', '.join(FORMATS)})")
+        if file_format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ValueError("format 'parquet' requires pyarrow to be installed on the MCP server")
+        # Same checks as the REST query path, without the default LIMIT: exports are meant to be large
+        export = Export(await validate_soql(query, default_limit=0), file_format)
+        export.task = asyncio.create_task(_run_export(export))
+        running_tasks.add(export.task)
+        export.task.add_done_callback(running_tasks.discard)
+        exports[export.export_id] = export
+        await _publish(export)
+        _evict_exports()
+    wait = min(max(float(wait), 0.0), BULK_JOB_TIMEOUT)
+    if export.task is not None and not export.task.done() and wait:
+        try:
+            await asyncio.wait_for(asyncio.shield(export.task), wait)
+        except asyncio.TimeoutError:
+            pass
+    return export.to_dict()
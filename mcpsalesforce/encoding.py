@@ -0,0 +1,112 @@
+# Wire encoding of /tools/call responses
+# The body format follows the Accept header: MessagePack (application/msgpack) or JSON, serialized with
+# orjson when it is installed. Large bodies are compressed with zstd or gzip, following
+# Accept-Encoding. Clients that send X-Records-Format: columnar get query records as a header plus
+# one array of values per record instead of one object per record.
+import os
+import gzip
+import json
+import asyncio
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bodies smaller than this are sent uncompressed (compression would cost more than it saves)
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL_GZIP = int(os.getenv("COMPRESS_LEVEL_GZIP", "5"))
+COMPRESS_LEVEL_ZSTD = int(os.getenv("COMPRESS_LEVEL_ZSTD", "3"))
+# Bodies larger than this are compressed off the event loop
+COMPRESS_THREAD_BYTES = 256 * 1024
+
+RECORDS_FORMAT_HEADER = "X-Records-Format"
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+
+# Quality value of each media type or coding in an Accept / Accept-Encoding header
+def _qualities(header: str) -> dict:
+    qualities = {}
+    for item in header.split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+    return qualities
+
+
+# MessagePack only when the client names it (wildcards such as curl's */* get JSON); on a tie it
+# wins over JSON since it is the smaller encoding
+def negotiate_media_type(request: Request) -> str:
+    qualities = _qualities(request.headers.get("accept", ""))
+    packed = max(qualities.get(MSGPACK, 0.0), qualities.get("application/x-msgpack", 0.0))
+    plain = max(qualities.get(JSON, 0.0), qualities.get("application/*", 0.0), qualities.get("*/*", 0.0))
+    return MSGPACK if msgpack is not None and packed > 0 and packed >= plain else JSON
+
+
+# zstd over gzip when the client accepts both equally (it is faster at a similar ratio)
+def negotiate_encoding(request: Request):
+    qualities = _qualities(request.headers.get("accept-encoding", ""))
+    zstd, gz = qualities.get("zstd", 0.0), qualities.get("gzip", 0.0)
+    if zstandard is not None and zstd > 0 and zstd >= gz:
+        return "zstd"
+    return "gzip" if gz > 0 else None
+
+
+def columnar_requested(request: Request) -> bool:
+    return request.headers.get(RECORDS_FORMAT_HEADER, "").lower() == "columnar"
+
+
+# Records as {"columns", "rows"}: columns in order of first appearance, Salesforce `attributes` dropped
+def to_columnar(records: list) -> dict:
+    columns = list(dict.fromkeys(key for record in records for key in record if key != "attributes"))
+    return {"columns": columns, "rows": [[record.get(column) for column in columns] for record in records]}
+
+
+def serialize(content, media_type: str) -> bytes:
+    if isinstance(content, BaseModel):
+        content = content.model_dump(exclude_unset=True)
+    elif isinstance(content, list):
+        content = [item.model_dump(exclude_unset=True) if isinstance(item, BaseModel) else item for item in content]
+    if media_type == MSGPACK:
+        return msgpack.packb(content, default=str)
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "zstd":
+        return zstandard.ZstdCompressor(level=COMPRESS_LEVEL_ZSTD).compress(body)
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL_GZIP)
+
+
+# Response for a tool call result (a model, or a list of models for a batch) in the negotiated format
+async def encode_response(request: Request, content) -> Response:
+    media_type = negotiate_media_type(request)
+    body = serialize(content, media_type)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    coding = negotiate_encoding(request) if len(body) >= COMPRESS_MIN_BYTES else None
+    if coding:
+        body = await asyncio.to_thread(compress, body, coding) if len(body) > COMPRESS_THREAD_BYTES else compress(body, coding)
+        headers["Content-Encoding"] = coding
+    return Response(body, media_type=media_type, headers=headers)
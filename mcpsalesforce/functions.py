@@ -1,34 +1,167 @@
 # Salesforce REST API integration functions for MCP tools
 import os
-import requests
+import re
+import asyncio
+import json
+import base64
+import time
+import random
+import logging
+import urllib.parse
+import httpx
 from typing import List, Dict, Any
+from common.cache import TTLCache
+from common.tracing import metrics, current_trace_id, SIZE_BUCKETS
+
+logger = logging.getLogger("functions")
 
 # Environment variables for Salesforce connection
 SALESFORCE_ACCESS_TOKEN = os.getenv("SALESFORCE_ACCESS_TOKEN")
 SALESFORCE_DOMAIN = os.getenv("SALESFORCE_DOMAIN")
 SALESFORCE_VERSION = os.getenv("SALESFORCE_VERSION")
 
-# Common headers for Salesforce REST API requests
-HEADERS = {
-    "Authorization": f"Bearer {SALESFORCE_ACCESS_TOKEN}",
-    "Content-Type": "application/json"
-}
+# Connection pool, concurrency and retry settings (override with environment variables)
+SALESFORCE_MAX_CONNECTIONS = int(os.getenv("SALESFORCE_MAX_CONNECTIONS", "20"))
+SALESFORCE_MAX_CONCURRENCY = int(os.getenv("SALESFORCE_MAX_CONCURRENCY", "10"))
+SALESFORCE_MAX_RETRIES = int(os.getenv("SALESFORCE_MAX_RETRIES", "3"))
+SALESFORCE_BACKOFF = float(os.getenv("SALESFORCE_BACKOFF", "0.5"))
+SALESFORCE_TIMEOUT = float(os.getenv("SALESFORCE_TIMEOUT", "30"))
+
+# Metadata cache settings: sObject list and describe results only change when admins deploy
+METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", "3600"))
+METADATA_CACHE_SIZE = int(os.getenv("METADATA_CACHE_SIZE", "256"))
+
+# Query paging: default record cap per tool call and how many pages are fetched ahead of the consumer
+QUERY_MAX_RECORDS = int(os.getenv("QUERY_MAX_RECORDS", "2000"))
+QUERY_PREFETCH_PAGES = int(os.getenv("QUERY_PREFETCH_PAGES", "2"))
+# Salesforce Composite Batch accepts at most 25 subrequests per call
+COMPOSITE_BATCH_LIMIT = 25
+
+# Status codes Salesforce uses for rate limiting and temporary unavailability
+RETRY_STATUS_CODES = {429, 503}
+
+
+# Shared async session for the Salesforce REST API.
+# All tool functions reuse one connection pool; a semaphore bounds how many requests are in
+# flight at once, and 429/503 responses are retried with exponential backoff.
+class SalesforceSession:
+    def __init__(
+        self,
+        domain: str = SALESFORCE_DOMAIN,
+        version: str = SALESFORCE_VERSION,
+        access_token: str = SALESFORCE_ACCESS_TOKEN,
+        max_connections: int = SALESFORCE_MAX_CONNECTIONS,
+        max_concurrency: int = SALESFORCE_MAX_CONCURRENCY,
+        max_retries: int = SALESFORCE_MAX_RETRIES,
+        backoff: float = SALESFORCE_BACKOFF,
+        timeout: float = SALESFORCE_TIMEOUT,
+        transport: httpx.AsyncBaseTransport = None,
+    ):
+        self.domain = (domain or "").rstrip("/")
+        self.version = version
+        # Common headers for Salesforce REST API requests
+        self.headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        }
+        # All requests go to a single instance host, so the pool limit is the per-host limit
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._timeout = httpx.Timeout(timeout)
+        self._transport = transport
+        self._max_concurrency = max_concurrency
+        self._semaphore = None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._client = None
+        self._loop = None
+
+    # Pooled connections belong to the event loop that opened them, so a new loop gets a new pool
+    def _http(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                base_url=self.domain,
+                headers=self.headers,
+                limits=self._limits,
+                timeout=self._timeout,
+                transport=self._transport,
+            )
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._client
+
+    # Paths starting with /services are used as-is (e.g. nextRecordsUrl); others are relative to /services/data/<version>/
+    def url(self, path: str) -> str:
+        if path.startswith("/services/"):
+            return path
+        return f"/services/data/{self.version}/{path}"
+
+    # Wait time before the next retry: honor Retry-After when Salesforce sends it
+    def _retry_delay(self, resp: httpx.Response, attempt: int) -> float:
+        retry_after = resp.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        client = self._http()
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            async with self._semaphore:
+                resp = await client.request(method, self.url(path), **kwargs)
+            self._record(method, resp, time.perf_counter() - started)
+            if resp.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                resp.raise_for_status()
+                return resp
+            metrics.inc("salesforce_retries_total", {"status": resp.status_code}, help="Salesforce requests retried after 429/503")
+            # Sleep outside the semaphore so other calls can proceed meanwhile
+            await asyncio.sleep(self._retry_delay(resp, attempt))
+            attempt += 1
+
+    # Wall time and payload size of each Salesforce request
+    def _record(self, method: str, resp: httpx.Response, elapsed: float):
+        labels = {"method": method, "status": resp.status_code}
+        metrics.observe("salesforce_request_duration_seconds", labels, elapsed, help="Wall time of each Salesforce REST request")
+        metrics.observe("salesforce_response_bytes", {"method": method}, len(resp.content), buckets=SIZE_BUCKETS,
+                        help="Size of each Salesforce REST response")
+        logger.info("trace=%s salesforce %s %s status=%s duration_ms=%.1f", current_trace_id(), method,
+                    resp.request.url.path, resp.status_code, elapsed * 1000)
+
+    async def get(self, path: str, **kwargs) -> Any:
+        resp = await self.request("GET", path, **kwargs)
+        return resp.json()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Process-wide session shared by all tool calls
+session = SalesforceSession()
+
+# Metadata caches, keyed by lower-cased object name since sObject API names are case-insensitive
+sobjects_cache = TTLCache("sobjects", max_size=1, ttl=METADATA_CACHE_TTL)
+describe_cache = TTLCache("describe", max_size=METADATA_CACHE_SIZE, ttl=METADATA_CACHE_TTL)
+METADATA_CACHES = {cache.name: cache for cache in (sobjects_cache, describe_cache)}
 
 # List all accessible Salesforce object types (e.g., Account, Contact, Case)
-def list_salesforce_objects() -> List[str]:
-    url = f"{SALESFORCE_DOMAIN}/services/data/{SALESFORCE_VERSION}/sobjects/"
-    resp = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
-    data = resp.json()
+async def list_salesforce_objects() -> List[str]:
+    objects = await sobjects_cache.aget("all")
+    if objects is not None:
+        return objects
+    data = await session.get("sobjects/")
     # The 'sobjects' key contains a list of objects, each with a 'name' field
-    return [obj['name'] for obj in data.get('sobjects', [])]
+    objects = [obj['name'] for obj in data.get('sobjects', [])]
+    await sobjects_cache.aset("all", objects)
+    return objects
 
-# Get schema details (fields, types, labels) for a specific Salesforce object
-def describe_salesforce_object(object_name: str) -> List[Dict[str, Any]]:
-    url = f"{SALESFORCE_DOMAIN}/services/data/{SALESFORCE_VERSION}/sobjects/{object_name}/describe/"
-    resp = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
-    data = resp.json()
+# Reduce a raw describe result to the field details the tools return
+def _describe_fields(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     fields = []
     for field in data.get('fields', []):
         field_info = {
@@ -45,14 +178,155 @@ def describe_salesforce_object(object_name: str) -> List[Dict[str, Any]]:
         # Add referenceTo if present
         if field.get("referenceTo"):
             field_info["referenceTo"] = field["referenceTo"]
+        # Add the relationship name used in SOQL paths (Owner.Name) if present
+        if field.get("relationshipName"):
+            field_info["relationshipName"] = field["relationshipName"]
         fields.append(field_info)
     return fields
 
-# Execute a SOQL query against Salesforce to retrieve records
-def query_salesforce_records(query: str) -> List[Dict[str, Any]]:
-    import urllib.parse
-    url = f"{SALESFORCE_DOMAIN}/services/data/{SALESFORCE_VERSION}/query/?q={urllib.parse.quote(query)}"
-    resp = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
-    data = resp.json()
-    return data.get("records", []) 
\ No newline at end of file
+# Get schema details (fields, types, labels) for a specific Salesforce object
+async def describe_salesforce_object(object_name: str) -> List[Dict[str, Any]]:
+    fields = await describe_cache.aget(object_name.lower())
+    if fields is not None:
+        return fields
+    data = await session.get(f"sobjects/{object_name}/describe/")
+    fields = _describe_fields(data)
+    await describe_cache.aset(object_name.lower(), fields)
+    return fields
+
+# Run several GET requests in Salesforce Composite Batch calls (up to 25 subrequests each, chunks sent
+# concurrently). Returns one {"statusCode", "result"} dict per path, in order.
+async def composite_batch(paths: List[str]) -> List[Dict[str, Any]]:
+    async def send(chunk):
+        body = {
+            "haltOnError": False,
+            "batchRequests": [{"method": "GET", "url": session.url(path)[len("/services/data/"):]} for path in chunk]
+        }
+        resp = await session.request("POST", "composite/batch", json=body)
+        return resp.json().get("results", [])
+
+    chunks = [paths[i:i + COMPOSITE_BATCH_LIMIT] for i in range(0, len(paths), COMPOSITE_BATCH_LIMIT)]
+    results = await asyncio.gather(*(send(chunk) for chunk in chunks))
+    return [result for chunk in results for result in chunk]
+
+# Describe several objects with one upstream Composite Batch call; results land in the describe cache.
+# Objects whose subrequest failed are left out, so a later describe_salesforce_object reports the error.
+async def prefetch_describes(object_names: List[str]):
+    names = list(dict.fromkeys(object_names))
+    cached = await asyncio.gather(*(describe_cache.aget(name.lower()) for name in names))
+    missing = [name for name, fields in zip(names, cached) if fields is None]
+    if len(missing) < 2:
+        return
+    results = await composite_batch([f"sobjects/{name}/describe/" for name in missing])
+    for name, result in zip(missing, results):
+        if result.get("statusCode", 500) < 400:
+            await describe_cache.aset(name.lower(), _describe_fields(result.get("result") or {}))
+
+# Fetch the first page of several queries with one upstream Composite Batch call.
+# Returns {query: first_page}; failed subrequests are left out and run individually later.
+async def prefetch_queries(queries: List[str]) -> Dict[str, Dict[str, Any]]:
+    queries = list(dict.fromkeys(queries))
+    if len(queries) < 2:
+        return {}
+    results = await composite_batch([f"query/?q={urllib.parse.quote(query)}" for query in queries])
+    return {
+        query: result["result"]
+        for query, result in zip(queries, results)
+        if result.get("statusCode", 500) < 400 and isinstance(result.get("result"), dict)
+    }
+
+# Page tokens are opaque to clients: the Salesforce URL of the page to resume from plus how many of
+# its records were already returned (a max_records cut can fall in the middle of a page). Only query
+# URLs are accepted back, a query cursor (nextRecordsUrl) or a first page cut short, so a crafted token
+# cannot make the server GET anything else with the org's token.
+_PAGE_URL = re.compile(r"/services/data/v\d+(?:\.\d+)?/(?:query|queryAll)/(?:[\w.]+-\d+|\?q=[^#]+)")
+
+def encode_page_token(url: str, skip: int = 0) -> str:
+    raw = json.dumps({"url": url, "skip": skip}).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_page_token(page_token: str):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(page_token.encode()))
+        url, skip = data["url"], int(data.get("skip", 0))
+    except Exception:
+        raise ValueError("Invalid page_token")
+    if not isinstance(url, str) or not _PAGE_URL.fullmatch(url):
+        raise ValueError("Invalid page_token")
+    return url, skip
+
+# Fetch query result pages following nextRecordsUrl. A background task keeps up to `prefetch` pages
+# queued ahead of the consumer, so Salesforce latency overlaps with processing of the previous page.
+# Yields (page_url, page_data) tuples. `first_page` is an already fetched first page (e.g. from a
+# Composite Batch call), in which case fetching starts at its nextRecordsUrl.
+async def iter_query_pages(url: str, headers: dict = None, prefetch: int = QUERY_PREFETCH_PAGES, first_page: dict = None):
+    queue = asyncio.Queue(maxsize=max(prefetch, 1))
+    end = object()
+
+    async def produce():
+        next_url, data = session.url(url), first_page
+        try:
+            while next_url:
+                if data is None:
+                    data = await session.get(next_url, headers=headers)
+                await queue.put((next_url, data))
+                next_url = None if data.get("done", True) else data.get("nextRecordsUrl")
+                data = None
+            await queue.put(end)
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is end:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        producer.cancel()
+
+# Execute a SOQL query against Salesforce and yield its records page by page, up to max_records.
+# Either `query` starts a new query or `page_token` resumes a previous one. When the generator
+# finishes, `summary` holds totalSize, done and next_page_token (None once all records were read).
+async def iter_query_records(query: str = None, max_records: int = QUERY_MAX_RECORDS, page_token: str = None, summary: dict = None, first_page: dict = None):
+    summary = {} if summary is None else summary
+    headers = None
+    if page_token:
+        url, skip = decode_page_token(page_token)
+    else:
+        url, skip = f"query/?q={urllib.parse.quote(query)}", 0
+        if max_records:
+            # Align Salesforce's page size with the requested cap (Salesforce accepts 200-2000)
+            headers = {"Sforce-Query-Options": f"batchSize={min(max(max_records, 200), 2000)}"}
+    summary.update({"totalSize": 0, "done": True, "next_page_token": None})
+    returned = 0
+    pages = iter_query_pages(url, headers=headers, first_page=None if page_token else first_page)
+    try:
+        async for page_url, data in pages:
+            summary["totalSize"] = data.get("totalSize", 0)
+            records = data.get("records", [])[skip:]
+            offset, skip = skip, 0
+            if max_records and returned + len(records) > max_records:
+                # Stop mid-page; the token resumes at the first record not returned
+                take = max_records - returned
+                yield records[:take]
+                summary.update({"done": False, "next_page_token": encode_page_token(page_url, offset + take)})
+                return
+            returned += len(records)
+            yield records
+            if not data.get("done", True) and max_records and returned >= max_records:
+                summary.update({"done": False, "next_page_token": encode_page_token(data["nextRecordsUrl"])})
+                return
+    finally:
+        await pages.aclose()
+
+# Execute a SOQL query against Salesforce to retrieve records (paginated; see iter_query_records)
+async def query_salesforce_records(query: str = None, max_records: int = QUERY_MAX_RECORDS, page_token: str = None, first_page: dict = None) -> Dict[str, Any]:
+    summary = {}
+    records = []
+    async for batch in iter_query_records(query, max_records, page_token, summary, first_page):
+        records.extend(batch)
+    return {"records": records, **summary}
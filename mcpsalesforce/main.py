@@ -1,14 +1,47 @@
 # FastAPI MCP server for Salesforce tool integration
+import os
+import sys
+# cache.py and tracing.py are shared with the orchestrator, in common/ at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from tools import TOOLS
-from functions import list_salesforce_objects, describe_salesforce_object, query_salesforce_records
+import json
+import time
+import asyncio
+import httpx
+import logging
+from common.tracing import metrics, current_trace_id, TraceMiddleware
+from soql import SOQLError, validate_soql, query_object
+from query_cache import query_cache, query_cache_key
+from bulk import BULK_WAIT_SECONDS, cancel_exports, export_salesforce_records
+from encoding import encode_response, columnar_requested, to_columnar
+from schemas import RPCResponse, RPCError, ListObjectsResult, DescribeResult, QueryResult, ExportResult
+from functions import session, METADATA_CACHES, QUERY_MAX_RECORDS, list_salesforce_objects, describe_salesforce_object, query_salesforce_records, iter_query_records, decode_page_token, prefetch_describes, prefetch_queries
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+# Launch mode for `python main.py`: WORKERS > 1 runs that many uvicorn worker processes (set
+# CACHE_BACKEND so they share caches); on shutdown, in-flight requests get up to
+# GRACEFUL_SHUTDOWN_TIMEOUT seconds to finish
+SERVER_WORKERS = int(os.getenv("WORKERS", "1"))
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+
+logger = logging.getLogger("mcpsalesforce")
+
+# Close the pooled Salesforce connections when the server shuts down
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await cancel_exports()
+    await session.aclose()
 
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for all origins (for development/demo purposes)
 app.add_middleware(
@@ -18,6 +51,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Trace ID per request (X-Trace-Id, forwarded by the orchestrator) and request duration metrics
+app.add_middleware(TraceMiddleware)
 
 # Endpoint: Return JSON-RPC tool definitions for MCP tools
 @app.get("/tools")
@@ -31,11 +66,118 @@ async def get_tools():
         "id": 0
     }
 
-# Endpoint: JSON-RPC tool call dispatcher
+# Pydantic model for cache invalidation: no cache name clears every cache, no key clears the whole cache
+class CacheInvalidateRequest(BaseModel):
+    cache: Optional[str] = None
+    key: Optional[str] = None
+
+# Metadata caches plus the query result cache (its invalidation key is an sObject name)
+CACHES = {**METADATA_CACHES, "queries": query_cache}
+
+# Endpoint: cache hit/miss metrics
+@app.get("/cache/stats")
+async def cache_stats():
+    return await asyncio.to_thread(lambda: {name: cache.stats() for name, cache in CACHES.items()})
+
+# Endpoint: invalidate caches (e.g. after a metadata deploy or a data load)
+@app.post("/cache/invalidate")
+async def cache_invalidate(request: Optional[CacheInvalidateRequest] = None):
+    request = request or CacheInvalidateRequest()
+    if request.cache is not None and request.cache not in CACHES:
+        return JSONResponse(status_code=404, content={"error": f"Unknown cache: {request.cache}"})
+    names = [request.cache] if request.cache else list(CACHES)
+    key = request.key.lower() if request.key else None
+    return {"invalidated": {name: await CACHES[name].ainvalidate(key) for name in names}}
+
+# NDJSON stream for query_salesforce_records: one {"records": [...]} line per page, then a final
+# JSON-RPC line with the totals and the next_page_token (or a JSON-RPC error line)
+async def stream_query(tool_name: str, query: str, max_records: int, page_token: str, req_id):
+    summary = {}
+    try:
+        async for batch in iter_query_records(query, max_records, page_token, summary):
+            yield json.dumps({"records": batch}) + "\n"
+        yield json.dumps({
+            "jsonrpc": "2.0",
+            "result": {"status": "success", "tool_name": tool_name, "query": query, **summary},
+            "id": req_id
+        }) + "\n"
+    except Exception as e:
+        yield json.dumps({
+            "jsonrpc": "2.0",
+            "error": {"code": -32000, "message": str(e), "data": {"salesforce_error_code": salesforce_error_code(e), "details": query or ""}},
+            "id": req_id
+        }) + "\n"
+
+# Endpoint: JSON-RPC tool call dispatcher (a single call object or a JSON-RPC 2.0 batch array).
+# Responses are encoded as negotiated by the client (see encoding.py); NDJSON streams pass through.
 @app.post("/tools/call")
 async def call_tool(request: Request):
     body = await request.json()
-    method = body.get("method")
+    if isinstance(body, list):
+        return await encode_response(request, await call_batch(body, request))
+    response = await timed_tool_call(body, request)
+    if isinstance(response, StreamingResponse):
+        return response
+    return await encode_response(request, response)
+
+# Run one tool call, recording its wall time per tool
+async def timed_tool_call(body: dict, request: Request, prefetched: dict = None, allow_stream: bool = True):
+    tool_name = body.get("params", {}).get("name")
+    started = time.perf_counter()
+    response = await run_tool_call(body, request, prefetched, allow_stream)
+    elapsed = time.perf_counter() - started
+    # Streamed queries are timed as a whole by the middleware
+    status = "stream" if isinstance(response, StreamingResponse) else "error" if response.error is not None else "ok"
+    metrics.observe("mcp_tool_duration_seconds", {"tool": tool_name, "status": status}, elapsed,
+                    help="Wall time of each MCP tool call")
+    logger.info("trace=%s tool=%s id=%s status=%s duration_ms=%.1f", current_trace_id(), tool_name, body.get("id"), status, elapsed * 1000)
+    return response
+
+# JSON-RPC 2.0 batch: all calls run concurrently. Describes and first query pages of the batch are
+# fetched up front with Salesforce Composite Batch calls, so N calls cost one upstream round trip.
+async def call_batch(calls: list, request: Request):
+    if not calls:
+        return RPCResponse(error=RPCError(code=-32600, message="Invalid Request: empty batch"), id=None)
+    valid = [call for call in calls if isinstance(call, dict) and isinstance(call.get("params", {}), dict)]
+    object_names, queries = [], []
+    for call in valid:
+        params = call.get("params", {})
+        arguments = params.get("arguments") or {}
+        if params.get("name") == "describe_salesforce_object" and arguments.get("object_name"):
+            object_names.append(arguments["object_name"])
+        elif params.get("name") == "query_salesforce_records" and arguments.get("query") and not arguments.get("page_token"):
+            queries.append(arguments)
+    prefetched = {}
+    try:
+        # Validation needs the describes of the queried objects, so they are fetched in the same batch
+        await asyncio.gather(
+            prefetch_describes(object_names + [name for name in (query_object(q["query"]) for q in queries) if name]),
+            list_salesforce_objects(),
+        )
+        validated = await asyncio.gather(*(validate_soql(q["query"]) for q in queries), return_exceptions=True)
+        # Queries the result cache will answer need no first page
+        candidates = [(query, arguments) for query, arguments in zip(validated, queries) if isinstance(query, str)]
+        fresh = await asyncio.gather(*(
+            query_cache.afresh(query_cache_key(query, int(arguments.get("max_records", QUERY_MAX_RECORDS) or 0) or None)[0],
+                               arguments.get("max_age"))
+            for query, arguments in candidates
+        ))
+        prefetched = await prefetch_queries([query for (query, _), cached in zip(candidates, fresh) if not cached])
+    except Exception as e:
+        # Composite Batch is an optimization only: on failure every call runs on its own
+        logger.warning("trace=%s composite batch failed, running calls individually: %s", current_trace_id(), e)
+
+    async def run(call):
+        if call not in valid:
+            return RPCResponse(error=RPCError(code=-32600, message="Invalid Request"), id=None)
+        return await timed_tool_call(call, request, prefetched, allow_stream=False)
+
+    responses = await asyncio.gather(*(run(call) for call in calls))
+    # Notifications (calls without an id) get no response
+    return [response for call, response in zip(calls, responses) if not isinstance(call, dict) or "id" in call]
+
+# Run a single JSON-RPC tool call; `prefetched` maps queries to first pages fetched by a batch
+async def run_tool_call(body: dict, request: Request, prefetched: dict = None, allow_stream: bool = True):
     params = body.get("params", {})
     tool_name = params.get("name")
     arguments = params.get("arguments", {})
@@ -44,68 +186,118 @@ async def call_tool(request: Request):
     try:
         # Route to the correct tool function based on tool_name
         if tool_name == "list_salesforce_objects":
-            objects = list_salesforce_objects()
-            return {
-                "jsonrpc": "2.0",
-                "result": {
-                    "status": "success",
-                    "tool_name": tool_name,
-                    "objects": objects
-                },
-                "id": req_id
-            }
+            objects = await list_salesforce_objects()
+            return RPCResponse(result=ListObjectsResult(tool_name=tool_name, objects=objects), id=req_id)
         elif tool_name == "describe_salesforce_object":
             object_name = arguments.get("object_name")
             if not object_name:
                 raise ValueError("Missing required parameter: object_name")
-            fields = describe_salesforce_object(object_name)
-            return {
-                "jsonrpc": "2.0",
-                "result": {
-                    "status": "success",
-                    "tool_name": tool_name,
-                    "object_name": object_name,
-                    "fields": fields
-                },
-                "id": req_id
-            }
+            fields = await describe_salesforce_object(object_name)
+            return RPCResponse(result=DescribeResult(tool_name=tool_name, object_name=object_name, fields=fields), id=req_id)
         elif tool_name == "query_salesforce_records":
             query = arguments.get("query")
-            if not query:
-                raise ValueError("Missing required parameter: query")
-            records = query_salesforce_records(query)
-            return {
-                "jsonrpc": "2.0",
-                "result": {
-                    "status": "success",
-                    "tool_name": tool_name,
-                    "records": records,
-                    "totalSize": len(records),
-                    "done": True
-                },
-                "id": req_id
-            }
+            page_token = arguments.get("page_token")
+            if not query and not page_token:
+                raise ValueError("Missing required parameter: query or page_token")
+            if page_token:
+                # Rejected here as invalid params, not midway through a stream
+                decode_page_token(page_token)
+            else:
+                # Unknown objects/fields are rejected here instead of by Salesforce; casing is repaired and a LIMIT added
+                query = await validate_soql(query)
+            max_records = arguments.get("max_records", QUERY_MAX_RECORDS)
+            max_records = int(max_records) if max_records else None
+            # Clients that accept NDJSON get the records streamed page by page
+            if allow_stream and "application/x-ndjson" in request.headers.get("accept", ""):
+                return StreamingResponse(
+                    stream_query(tool_name, query, max_records, page_token, req_id),
+                    media_type="application/x-ndjson"
+                )
+            # Complete results of identical (normalized) queries are served from the result cache;
+            # max_age (seconds) bounds how old a cached result may be, 0 forces a fresh query
+            max_age = arguments.get("max_age")
+            cache_key, object_name = query_cache_key(query, max_records) if not page_token else (None, None)
+            cached = await query_cache.aget(cache_key, float(max_age) if max_age is not None else None) if cache_key else None
+            if cached is not None:
+                result, age = cached
+            else:
+                first_page = None if page_token else (prefetched or {}).get(query)
+                result = await query_salesforce_records(query, max_records, page_token, first_page)
+                age = None
+                # Results that stop at a next_page_token are not cached: the Salesforce cursor behind it expires
+                if cache_key and result["next_page_token"] is None:
+                    await query_cache.aset(cache_key, object_name, result)
+            # Columnar records (header + value arrays) for clients that ask for them
+            records = to_columnar(result["records"]) if columnar_requested(request) else result["records"]
+            return RPCResponse(result=QueryResult(
+                tool_name=tool_name,
+                query=query,
+                records=records,
+                totalSize=result["totalSize"],
+                done=result["done"],
+                next_page_token=result["next_page_token"],
+                cached=cached is not None,
+                cache_age=round(age, 3) if age is not None else None
+            ), id=req_id)
+        elif tool_name == "export_salesforce_records":
+            # Bulk API 2.0 export: returns a handle (export_id, state, file path) and, once done, summary statistics
+            export = await export_salesforce_records(
+                arguments.get("query"), arguments.get("format", "csv"), arguments.get("export_id"),
+                arguments.get("wait", BULK_WAIT_SECONDS)
+            )
+            if export["state"] == "Failed":
+                raise RuntimeError(f"Bulk export {export['export_id']} failed: {export['error']}")
+            return RPCResponse(result=ExportResult(tool_name=tool_name, **export), id=req_id)
         else:
             raise Exception(f"Unknown tool: {tool_name}")
     except Exception as e:
         # Return error in JSON-RPC format
-        return JSONResponse(
-            status_code=200,
-            content={
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": -32000,
-                    "message": str(e),
-                    "data": {
-                        "salesforce_error_code": "INVALID_SOQL_SYNTAX",
-                        "details": arguments.get("query", "")
-                    }
-                },
-                "id": req_id
-            }
-        )
+        data = {
+            "salesforce_error_code": salesforce_error_code(e),
+            "details": arguments.get("query", "")
+        }
+        if isinstance(e, SOQLError) and e.suggestions:
+            data["suggestions"] = e.suggestions
+        return RPCResponse(error=RPCError(
+            # Invalid params for requests rejected before reaching Salesforce
+            code=-32602 if isinstance(e, ValueError) else -32000,
+            message=str(e),
+            data=data
+        ), id=req_id)
+
+# Error code reported to clients: the local validator's code, Salesforce's own errorCode, or a generic one
+def salesforce_error_code(e: Exception) -> str:
+    if isinstance(e, SOQLError):
+        return e.code
+    if isinstance(e, httpx.HTTPStatusError):
+        try:
+            errors = e.response.json()
+            return errors[0]["errorCode"] if isinstance(errors, list) else errors.get("errorCode", f"HTTP_{e.response.status_code}")
+        except (ValueError, KeyError, IndexError, AttributeError):
+            return f"HTTP_{e.response.status_code}"
+    if isinstance(e, ValueError):
+        return "INVALID_ARGUMENT"
+    return "UNKNOWN_ERROR"
+
+# Endpoint: Prometheus-style metrics (tool and Salesforce latencies, payload sizes, retries, caches)
+@app.get("/metrics")
+async def metrics_endpoint():
+    samples = await asyncio.to_thread(metrics.collect)
+    return PlainTextResponse(metrics.render(samples), media_type="text/plain; version=0.0.4")
+
+# Export metadata cache sizes and hit counts as gauges on /metrics
+def _cache_samples():
+    return [
+        (f"metadata_cache_{name}", {"cache": cache_name}, value)
+        for cache_name, cache in CACHES.items()
+        for name, value in cache.stats().items()
+    ]
+
+metrics.register_collector(_cache_samples)
 
 # Run the server if executed directly
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8010) 
\ No newline at end of file
+    # Worker processes import the app themselves, which needs its import string
+    uvicorn.run(app if SERVER_WORKERS == 1 else "main:app", host="0.0.0.0", port=8010,
+                workers=SERVER_WORKERS, timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT)
@@ -0,0 +1,198 @@
+# Result cache for query_salesforce_records
+# Completed query results are cached under their normalized SOQL (whitespace, operator spacing, keyword
+# and name case, SELECT field order and clause order do not matter), with a TTL per sObject, a memory cap with LRU
+# eviction and an optional second tier that survives restarts and holds what memory evicts: a SQLite
+# file of its own (QUERY_CACHE_DISK_PATH) or the store shared by all workers (CACHE_BACKEND). With the
+# shared store there is no memory tier, so an invalidation in one worker reaches all of them.
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from common.cache import SQLiteStore, shared_store
+from soql import CLAUSES, parse_soql, split_top_level
+
+logger = logging.getLogger("query_cache")
+
+# Default TTL (seconds) and per-object overrides, e.g. "Account=600,Case=30" (0 disables caching)
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "60"))
+QUERY_CACHE_OBJECT_TTLS = os.getenv("QUERY_CACHE_OBJECT_TTLS", "")
+# Memory cap for cached results, in bytes of serialized JSON
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Optional disk tier: SQLite file path and its size cap in results (also applies to the shared store)
+QUERY_CACHE_DISK_PATH = os.getenv("QUERY_CACHE_DISK_PATH")
+QUERY_CACHE_DISK_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_DISK_MAX_ENTRIES", "10000"))
+
+
+def _object_ttls(spec: str) -> dict:
+    ttls = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, ttl = item.partition("=")
+        ttls[name.strip().lower()] = float(ttl)
+    return ttls
+
+
+# Comparison operators and commas, spaced the same way in every key ("Name='A'" and "Name = 'A'")
+_OPERATORS = re.compile(r"\s*(<>|!=|<=|>=|=|<|>)\s*")
+_COMMAS = re.compile(r"\s*,\s*")
+
+
+# Canonical form of a query: lowercase outside string literals, single spaces around operators and
+# after commas, SELECT items sorted and clauses in SOQL order. Returns (key, lowercase object name).
+def normalize_soql(query: str):
+    clauses = parse_soql(query.strip().rstrip(";").strip())
+    parts = []
+    for clause in CLAUSES:
+        if clause not in clauses:
+            continue
+        text = clauses[clause]
+        if clause == "SELECT":
+            text = ", ".join(sorted(split_top_level(text), key=str.lower))
+        # Literals keep their case; everything else is case-insensitive in SOQL
+        text = "".join(
+            piece if piece.startswith("'") else _normalize_words(piece)
+            for piece in re.split(r"('(?:\\.|[^'\\])*')", text)
+        )
+        parts.append(f"{clause.lower()} {text.strip()}")
+    return " ".join(parts), clauses["FROM"].split()[0].lower()
+
+
+# Text between string literals: lowercase, operators and commas spaced, runs of whitespace collapsed
+# (a single space is kept where the text meets a literal)
+def _normalize_words(text: str) -> str:
+    text = _COMMAS.sub(", ", _OPERATORS.sub(r" \1 ", text.lower()))
+    words = " ".join(text.split())
+    return (" " if text[:1].isspace() else "") + words + (" " if words and text[-1:].isspace() else "")
+
+
+class QueryCache:
+    def __init__(self, ttl: float = QUERY_CACHE_TTL, object_ttls: dict = None, max_bytes: int = QUERY_CACHE_MAX_BYTES,
+                 disk_path: str = QUERY_CACHE_DISK_PATH, disk_max_entries: int = QUERY_CACHE_DISK_MAX_ENTRIES):
+        self.ttl = ttl
+        self.object_ttls = object_ttls if object_ttls is not None else _object_ttls(QUERY_CACHE_OBJECT_TTLS)
+        self.max_bytes = max_bytes
+        self.disk_max_entries = disk_max_entries
+        self._data = OrderedDict()  # key -> (object, stored_at, expires_at, payload json)
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._disk = SQLiteStore(disk_path) if disk_path else shared_store
+        # A memory tier per worker would keep serving results another worker invalidated
+        self._memory = self._disk is None or self._disk is not shared_store
+
+    def ttl_for(self, object_name: str) -> float:
+        return self.object_ttls.get(object_name.lower(), self.ttl)
+
+    # Return (value, age in seconds) or None. `max_age` further limits how old a hit may be;
+    # max_age=0 always misses, so the caller refreshes the entry.
+    async def aget(self, key: str, max_age: float = None):
+        entry = self._data.get(key)
+        from_disk = False
+        if entry is None and self._disk is not None:
+            entry = await self._disk_get(key)
+            from_disk = entry is not None
+        now = time.time()
+        if entry is None or entry[2] <= now or (max_age is not None and now - entry[1] > max_age):
+            self.misses += 1
+            return None
+        if from_disk:
+            self._store(key, entry)
+            self.disk_hits += 1
+        elif key in self._data:
+            self._data.move_to_end(key)
+        self.hits += 1
+        return json.loads(entry[3]), now - entry[1]
+
+    # Whether aget() would hit, without counting a lookup (used to skip prefetching cached queries)
+    async def afresh(self, key: str, max_age: float = None) -> bool:
+        entry = self._data.get(key) or (await self._disk_get(key) if self._disk is not None else None)
+        now = time.time()
+        return entry is not None and entry[2] > now and (max_age is None or now - entry[1] <= float(max_age))
+
+    async def aset(self, key: str, object_name: str, value):
+        ttl = self.ttl_for(object_name)
+        if ttl <= 0:
+            return
+        now = time.time()
+        entry = (object_name.lower(), now, now + ttl, json.dumps(value, default=str))
+        if len(entry[3]) > self.max_bytes:
+            return
+        self._store(key, entry)
+        if self._disk is not None:
+            await self._disk_set(key, entry)
+
+    def _store(self, key: str, entry: tuple):
+        if not self._memory:
+            return
+        previous = self._data.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous[3])
+        self._data[key] = entry
+        self._bytes += len(entry[3])
+        # Least recently used results go first (they stay on disk when the disk tier is on)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self._bytes -= len(evicted[3])
+            self.evictions += 1
+
+    # The second tier is best effort: when it fails the lookup is a miss and the result stays in memory.
+    # Its I/O runs in a worker thread; the memory tier is only touched on the event loop.
+    async def _disk_get(self, key: str):
+        try:
+            entry = await asyncio.to_thread(self._disk.get, "queries", key)
+        except Exception as e:
+            logger.warning("Query cache store lookup failed: %s", e)
+            return None
+        return tuple(entry) if entry else None
+
+    async def _disk_set(self, key: str, entry: tuple):
+        try:
+            await asyncio.to_thread(self._disk.set, "queries", key, list(entry), entry[2] - time.time(), self.disk_max_entries)
+        except Exception as e:
+            logger.warning("Query cache store write failed: %s", e)
+
+    # Drop the results of one sObject (key = lowercase object name), or everything when key is None.
+    # Cache keys start with the object name, so the second tier can drop them by prefix.
+    async def ainvalidate(self, key: str = None) -> int:
+        keys = [k for k, entry in self._data.items() if key is None or entry[0] == key]
+        for k in keys:
+            self._bytes -= len(self._data.pop(k)[3])
+        if self._disk is not None:
+            try:
+                return max(len(keys), await asyncio.to_thread(self._disk.clear, "queries", "" if key is None else f"{key}|"))
+            except Exception as e:
+                logger.warning("Query cache store invalidation failed: %s", e)
+        return len(keys)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            "size": len(self._data),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+        if self._disk is not None:
+            try:
+                stats["disk_size"] = self._disk.size("queries")
+            except Exception as e:
+                logger.warning("Query cache store size failed: %s", e)
+        return stats
+
+
+query_cache = QueryCache()
+
+
+# Cache key of one tool call: the object (for invalidation by prefix), the normalized query and the record cap
+def query_cache_key(query: str, max_records) -> tuple:
+    normalized, object_name = normalize_soql(query)
+    return f"{object_name}|{normalized}|{max_records}", object_name
@@ -0,0 +1,87 @@
+# Typed JSON-RPC responses of the MCP tools
+# run_tool_call builds these models, and encoding.py serializes them with exclude_unset: optional
+# fields that were not set are left out of the payload (a describe field without picklist values has
+# no "values" key), while fields passed explicitly as None (next_page_token) are kept.
+from typing import Any, Dict, List, Optional, Union
+from pydantic import BaseModel
+
+
+# Fields with a non-None default ("jsonrpc", "status") count as set, so they are always serialized
+class Payload(BaseModel):
+    def model_post_init(self, context: Any):
+        self.__pydantic_fields_set__.update(
+            name for name, field in type(self).model_fields.items() if field.default is not None
+        )
+
+
+class DescribeField(Payload):
+    name: str
+    type: Optional[str] = None
+    label: Optional[str] = None
+    values: Optional[List[str]] = None
+    formula: Optional[str] = None
+    referenceTo: Optional[List[str]] = None
+    relationshipName: Optional[str] = None
+
+
+# Records as a header plus one array of values per record (requested with X-Records-Format: columnar)
+class ColumnarRecords(Payload):
+    columns: List[str]
+    rows: List[List[Any]]
+
+
+class ListObjectsResult(Payload):
+    status: str = "success"
+    tool_name: str
+    objects: List[str]
+
+
+class DescribeResult(Payload):
+    status: str = "success"
+    tool_name: str
+    object_name: str
+    fields: List[DescribeField]
+
+
+class QueryResult(Payload):
+    status: str = "success"
+    tool_name: str
+    query: Optional[str] = None
+    records: Union[ColumnarRecords, List[Dict[str, Any]]]
+    totalSize: int
+    done: bool
+    next_page_token: Optional[str] = None
+    cached: bool = False
+    cache_age: Optional[float] = None
+
+
+class ExportResult(Payload):
+    status: str = "success"
+    tool_name: str
+    export_id: str
+    job_id: Optional[str] = None
+    state: str
+    query: str
+    format: str
+    path: Optional[str] = None
+    bytes: int = 0
+    chunks: int = 0
+    duration_seconds: float
+    summary: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class RPCError(Payload):
+    code: int
+    message: str
+    data: Optional[Dict[str, Any]] = None
+
+
+ToolResult = Union[ListObjectsResult, DescribeResult, QueryResult, ExportResult]
+
+
+class RPCResponse(Payload):
+    jsonrpc: str = "2.0"
+    result: Optional[ToolResult] = None
+    error: Optional[RPCError] = None
+    id: Any = None
@@ -0,0 +1,251 @@
+# Local SOQL validation and repair against cached describe metadata
+# Queries are checked before they reach Salesforce: the sObject and every field referenced in SELECT,
+# WHERE, GROUP BY and ORDER BY must exist (names differing only in case are repaired), unknown names
+# are rejected with the nearest valid names as suggestions, and a LIMIT is added to non-aggregate
+# queries that have none so a vague prompt cannot pull a whole table.
+import os
+import re
+import difflib
+import logging
+from typing import List, Dict
+from functions import list_salesforce_objects, describe_salesforce_object
+
+logger = logging.getLogger("soql")
+
+SOQL_VALIDATION = os.getenv("SOQL_VALIDATION", "true").lower() in ("1", "true", "yes")
+# LIMIT added to queries without one (0 disables)
+SOQL_DEFAULT_LIMIT = int(os.getenv("SOQL_DEFAULT_LIMIT", "2000"))
+SOQL_MAX_SUGGESTIONS = 3
+
+CLAUSES = ("SELECT", "FROM", "USING SCOPE", "WHERE", "WITH", "GROUP BY", "HAVING", "ORDER BY", "LIMIT", "OFFSET", "FOR", "UPDATE", "ALL ROWS")
+AGGREGATES = {"COUNT", "COUNT_DISTINCT", "SUM", "AVG", "MIN", "MAX"}
+# Functions whose argument is a field (date functions, translations, formatting, ...)
+FIELD_FUNCTIONS = AGGREGATES | {
+    "CALENDAR_MONTH", "CALENDAR_QUARTER", "CALENDAR_YEAR", "DAY_IN_MONTH", "DAY_IN_WEEK", "DAY_IN_YEAR",
+    "DAY_ONLY", "FISCAL_MONTH", "FISCAL_QUARTER", "FISCAL_YEAR", "HOUR_IN_DAY", "WEEK_IN_MONTH",
+    "WEEK_IN_YEAR", "TOLABEL", "FORMAT", "CONVERTCURRENCY", "GROUPING", "ROLLUP", "CUBE",
+}
+OPERATORS = r"(?:=|!=|<>|<=|>=|<|>|\bLIKE\b|\bNOT\s+IN\b|\bIN\b|\bINCLUDES\b|\bEXCLUDES\b)"
+IDENTIFIER = re.compile(r"^[A-Za-z_][\w]*(\.[A-Za-z_][\w]*)*$")
+
+
+# Raised for queries rejected locally; `code` follows Salesforce's error codes
+class SOQLError(ValueError):
+    def __init__(self, code: str, message: str, suggestions: List[str] = None):
+        super().__init__(message)
+        self.code = code
+        self.suggestions = suggestions or []
+
+
+# Replace string literals and the contents of parentheses by spaces, keeping offsets, so clause
+# keywords can be searched at the top level only
+def _mask(query: str) -> str:
+    masked, depth, quote = [], 0, False
+    for i, char in enumerate(query):
+        if quote:
+            masked.append(" ")
+            if char == "'" and query[i - 1] != "\\":
+                quote = False
+        elif char == "'":
+            quote = True
+            masked.append(" ")
+        elif char == "(":
+            depth += 1
+            masked.append("(" if depth == 1 else " ")
+        elif char == ")":
+            depth -= 1
+            masked.append(")" if depth == 0 else " ")
+        else:
+            masked.append(char if depth == 0 else " ")
+    if quote or depth:
+        raise SOQLError("MALFORMED_QUERY", "Unbalanced quotes or parentheses in SOQL query")
+    return "".join(masked)
+
+
+# Split a query into its top-level clauses: {"SELECT": "...", "FROM": "...", ...}
+def parse_soql(query: str) -> Dict[str, str]:
+    masked = _mask(query)
+    pattern = r"\b(" + "|".join(clause.replace(" ", r"\s+") for clause in CLAUSES) + r")\b"
+    matches = list(re.finditer(pattern, masked, flags=re.IGNORECASE))
+    if not matches or matches[0].start() != 0 or matches[0].group(1).upper() != "SELECT":
+        raise SOQLError("MALFORMED_QUERY", "SOQL query must start with SELECT")
+    clauses = {}
+    for match, following in zip(matches, matches[1:] + [None]):
+        keyword = " ".join(match.group(1).upper().split())
+        end = following.start() if following else len(query)
+        if keyword in clauses:
+            raise SOQLError("MALFORMED_QUERY", f"Duplicate {keyword} clause in SOQL query")
+        clauses[keyword] = query[match.end():end].strip()
+    if not clauses.get("SELECT") or not clauses.get("FROM"):
+        raise SOQLError("MALFORMED_QUERY", "SOQL query needs SELECT <fields> FROM <object>")
+    return clauses
+
+
+# Split a clause on its top-level commas
+def split_top_level(text: str) -> List[str]:
+    masked = _mask(text)
+    items, start = [], 0
+    for i, char in enumerate(masked):
+        if char == ",":
+            items.append(text[start:i].strip())
+            start = i + 1
+    items.append(text[start:].strip())
+    return [item for item in items if item]
+
+
+# Field names used by a SELECT / GROUP BY / ORDER BY item: functions are unwrapped, subqueries and
+# TYPEOF expressions are skipped (they refer to other objects)
+def _item_fields(item: str) -> List[str]:
+    item = item.strip()
+    if not item or item.startswith("(") or item.upper().startswith("TYPEOF"):
+        return []
+    function = re.match(r"^([A-Za-z_]\w*)\s*\((.*)\)", item, flags=re.DOTALL)
+    if function:
+        if function.group(1).upper() not in FIELD_FUNCTIONS:
+            return []
+        return [field for argument in split_top_level(function.group(2)) for field in _item_fields(argument)]
+    name = item.split()[0]
+    return [name] if IDENTIFIER.match(name) else []
+
+
+# Offset of the parenthesis closing the one at `start` (string literals already blanked)
+def _closing(text: str, start: int) -> int:
+    depth = 0
+    for i in range(start, len(text)):
+        depth += {"(": 1, ")": -1}.get(text[i], 0)
+        if depth == 0:
+            return i
+    raise SOQLError("MALFORMED_QUERY", "Unbalanced parentheses in SOQL query")
+
+
+# Field names compared in a WHERE / HAVING condition (semi-join subqueries and literals are ignored)
+def _condition_fields(condition: str) -> List[str]:
+    # Blank out string literals and (SELECT ...) subqueries, keeping the grouping parentheses
+    text = re.sub(r"'(?:\\.|[^'\\])*'", lambda m: " " * len(m.group()), condition)
+    for match in re.finditer(r"\(\s*SELECT\b", text, flags=re.IGNORECASE):
+        close = _closing(text, match.start())
+        text = text[:match.start()] + " " * (close + 1 - match.start()) + text[close + 1:]
+    fields = []
+    # FUNCTION(field) > value
+    for match in re.finditer(r"([A-Za-z_]\w*)\s*\(\s*([A-Za-z_][\w.]*)\s*\)\s*" + OPERATORS, text, flags=re.IGNORECASE):
+        if match.group(1).upper() in FIELD_FUNCTIONS:
+            fields.append(match.group(2))
+    # field = value
+    for match in re.finditer(r"(?<![\w.])([A-Za-z_][\w.]*)\s*" + OPERATORS, text, flags=re.IGNORECASE):
+        if match.group(1).upper() not in ("AND", "OR", "NOT"):
+            fields.append(match.group(1))
+    return fields
+
+
+def _suggest(name: str, candidates: List[str]) -> List[str]:
+    by_lower = {candidate.lower(): candidate for candidate in candidates}
+    matches = difflib.get_close_matches(name.lower(), list(by_lower), n=SOQL_MAX_SUGGESTIONS, cutoff=0.6)
+    return [by_lower[match] for match in matches]
+
+
+# Replace whole-word occurrences of a name outside string literals
+def _replace_name(query: str, old: str, new: str) -> str:
+    parts = re.split(r"('(?:\\.|[^'\\])*')", query)
+    pattern = re.compile(r"(?<![\w.])" + re.escape(old) + r"(?![\w])")
+    return "".join(part if part.startswith("'") else pattern.sub(new, part) for part in parts)
+
+
+# Resolve one referenced field against the describe: returns its correctly cased name
+def _resolve_field(name: str, fields: Dict[str, str], relationships: Dict[str, str], object_name: str) -> str:
+    head, dot, rest = name.partition(".")
+    if dot:
+        # Only the first hop of a relationship path is checked (the rest belongs to another object)
+        if head.lower() in relationships:
+            return f"{relationships[head.lower()]}.{rest}"
+        if head.lower() == object_name.lower():
+            return f"{object_name}.{_resolve_field(rest, fields, relationships, object_name)}"
+        raise SOQLError(
+            "INVALID_FIELD",
+            f"No such relationship '{head}' on entity '{object_name}'",
+            _suggest(head, list(relationships.values())),
+        )
+    if name.lower() in fields:
+        return fields[name.lower()]
+    raise SOQLError(
+        "INVALID_FIELD",
+        f"No such column '{name}' on entity '{object_name}'",
+        _suggest(name, list(fields.values())),
+    )
+
+
+def _is_aggregate(select: str) -> bool:
+    return any(
+        re.match(r"^([A-Za-z_]\w*)\s*\(", item) and item.split("(")[0].strip().upper() in AGGREGATES
+        for item in split_top_level(select)
+    )
+
+
+# Add a LIMIT before any OFFSET / FOR / ALL ROWS clause
+def _inject_limit(query: str, limit: int) -> str:
+    masked = _mask(query)
+    match = re.search(r"\b(OFFSET|FOR|ALL\s+ROWS)\b", masked, flags=re.IGNORECASE)
+    if match:
+        return f"{query[:match.start()].rstrip()} LIMIT {limit} {query[match.start():]}"
+    return f"{query.rstrip()} LIMIT {limit}"
+
+
+# sObject a query reads from, or None when it does not parse
+def query_object(query: str):
+    try:
+        return parse_soql(query.strip())["FROM"].split()[0]
+    except (SOQLError, IndexError):
+        return None
+
+
+# Validate a query against the cached sObject list and describes, repairing name casing and adding
+# a default LIMIT (default_limit=0 adds none). Returns the query to run; raises SOQLError for
+# queries Salesforce would reject.
+async def validate_soql(query: str, default_limit: int = SOQL_DEFAULT_LIMIT) -> str:
+    query = query.strip().rstrip(";").strip()
+    clauses = parse_soql(query)
+    if SOQL_VALIDATION:
+        query = await _check_names(query, clauses)
+        clauses = parse_soql(query)
+    if default_limit and "LIMIT" not in clauses and not _is_aggregate(clauses["SELECT"]):
+        query = _inject_limit(query, default_limit)
+    return query
+
+
+async def _check_names(query: str, clauses: Dict[str, str]) -> str:
+    from_clause = clauses["FROM"].split()
+    object_name = from_clause[0]
+    try:
+        objects = await list_salesforce_objects()
+    except Exception as e:
+        # Metadata is unavailable: let Salesforce validate the query
+        logger.warning("Skipping SOQL validation, sObject list unavailable: %s", e)
+        return query
+    by_lower = {name.lower(): name for name in objects}
+    if object_name.lower() not in by_lower:
+        raise SOQLError("INVALID_TYPE", f"sObject type '{object_name}' is not supported", _suggest(object_name, objects))
+    if by_lower[object_name.lower()] != object_name:
+        query = _replace_name(query, object_name, by_lower[object_name.lower()])
+        object_name = by_lower[object_name.lower()]
+    try:
+        describe = await describe_salesforce_object(object_name)
+    except Exception as e:
+        logger.warning("Skipping SOQL field validation for %s, describe unavailable: %s", object_name, e)
+        return query
+    fields = {field["name"].lower(): field["name"] for field in describe}
+    relationships = {field["relationshipName"].lower(): field["relationshipName"] for field in describe if field.get("relationshipName")}
+    # An alias after the object name (FROM Account a) may prefix fields like a.Name
+    alias = from_clause[1] if len(from_clause) > 1 and IDENTIFIER.match(from_clause[1]) else None
+    referenced = [field for item in split_top_level(clauses["SELECT"]) for field in _item_fields(item)]
+    for clause in ("GROUP BY", "ORDER BY"):
+        if clause in clauses:
+            referenced += [field for item in split_top_level(clauses[clause]) for field in _item_fields(item)]
+    for clause in ("WHERE", "HAVING"):
+        if clause in clauses:
+            referenced += _condition_fields(clauses[clause])
+    for name in dict.fromkeys(referenced):
+        if alias and name.lower().startswith(alias.lower() + "."):
+            name = name[len(alias) + 1:]
+        resolved = _resolve_field(name, fields, relationships, object_name)
+        if resolved != name:
+            query = _replace_name(query, name, resolved)
+    return query
@@ -0,0 +1,121 @@
+# Local SOQL validation: name checks and repairs against describe metadata, and the default LIMIT
+import os
+import sys
+import asyncio
+import pytest
+
+MCPSALESFORCE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [MCPSALESFORCE, os.path.dirname(MCPSALESFORCE)]
+import soql
+from soql import SOQLError, validate_soql
+
+LIMIT = soql.SOQL_DEFAULT_LIMIT
+DESCRIBES = {
+    "Account": [
+        {"name": "Id"}, {"name": "Name"}, {"name": "Industry"}, {"name": "AnnualRevenue"},
+        {"name": "OwnerId", "relationshipName": "Owner"}, {"name": "ParentId", "relationshipName": "Parent"},
+    ],
+    "Contact": [{"name": "Id"}, {"name": "LastName"}, {"name": "AccountId", "relationshipName": "Account"}],
+}
+
+
+@pytest.fixture(autouse=True)
+def org_metadata(monkeypatch):
+    async def list_salesforce_objects():
+        return list(DESCRIBES)
+
+    async def describe_salesforce_object(object_name):
+        return DESCRIBES[object_name]
+    monkeypatch.setattr(soql, "list_salesforce_objects", list_salesforce_objects)
+    monkeypatch.setattr(soql, "describe_salesforce_object", describe_salesforce_object)
+
+
+def validate(query: str, **kwargs) -> str:
+    return asyncio.run(validate_soql(query, **kwargs))
+
+
+def rejection(query: str) -> SOQLError:
+    with pytest.raises(SOQLError) as error:
+        validate(query)
+    return error.value
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT COUNT() FROM Account", "SELECT COUNT() FROM Account"),
+    ("select industry, count(id) from account group by industry",
+     "select Industry, count(Id) from Account group by Industry"),
+    ("SELECT Industry, SUM(annualrevenue) FROM Account GROUP BY Industry HAVING SUM(annualrevenue) > 100",
+     "SELECT Industry, SUM(AnnualRevenue) FROM Account GROUP BY Industry HAVING SUM(AnnualRevenue) > 100"),
+])
+def test_aggregates_get_no_limit(query, expected):
+    assert validate(query) == expected
+
+
+def test_aggregate_argument_is_checked():
+    error = rejection("SELECT MAX(Revenue) FROM Account")
+    assert error.code == "INVALID_FIELD"
+    assert "AnnualRevenue" in error.suggestions
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT Id FROM Account WHERE Id IN (SELECT AccountId FROM Contact)",
+    "SELECT Id FROM Account WHERE Id NOT IN (SELECT AccountId FROM Contact WHERE LastName = 'Smith')",
+    "SELECT Name, (SELECT LastName FROM Contacts) FROM Account",
+])
+def test_subqueries_are_not_checked_against_the_outer_object(query):
+    assert validate(query) == f"{query} LIMIT {LIMIT}"
+
+
+def test_semi_join_field_is_checked():
+    error = rejection("SELECT Id FROM Account WHERE Nmae IN (SELECT LastName FROM Contact)")
+    assert error.code == "INVALID_FIELD"
+    assert error.suggestions == ["Name"]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT owner.Name FROM Account", "SELECT Owner.Name FROM Account"),
+    ("SELECT Name FROM Account WHERE parent.Industry = 'Energy'", "SELECT Name FROM Account WHERE Parent.Industry = 'Energy'"),
+    ("SELECT Account.name FROM Account", "SELECT Account.Name FROM Account"),
+    ("SELECT LastName, account.Name FROM contact", "SELECT LastName, Account.Name FROM Contact"),
+])
+def test_relationship_fields(query, expected):
+    assert validate(query, default_limit=0) == expected
+
+
+def test_unknown_relationship_is_rejected():
+    error = rejection("SELECT Ownr.Name FROM Account")
+    assert error.code == "INVALID_FIELD"
+    assert error.suggestions == ["Owner"]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT Id FROM Account", f"SELECT Id FROM Account LIMIT {LIMIT}"),
+    ("SELECT Id FROM Account;", f"SELECT Id FROM Account LIMIT {LIMIT}"),
+    ("SELECT Id FROM Account LIMIT 5", "SELECT Id FROM Account LIMIT 5"),
+    ("SELECT Id FROM Account ORDER BY Name OFFSET 10", f"SELECT Id FROM Account ORDER BY Name LIMIT {LIMIT} OFFSET 10"),
+    ("SELECT Id FROM Account FOR VIEW", f"SELECT Id FROM Account LIMIT {LIMIT} FOR VIEW"),
+    ("SELECT Id FROM Account WHERE Name = 'OFFSET 5'", f"SELECT Id FROM Account WHERE Name = 'OFFSET 5' LIMIT {LIMIT}"),
+])
+def test_limit_injection(query, expected):
+    assert validate(query) == expected
+
+
+def test_no_default_limit():
+    assert validate("SELECT Id FROM Account", default_limit=0) == "SELECT Id FROM Account"
+
+
+def test_invalid_field_suggestions():
+    error = rejection("SELECT Id, Nme FROM Account")
+    assert error.code == "INVALID_FIELD"
+    assert error.suggestions[0] == "Name"
+    assert "'Nme'" in str(error)
+
+
+def test_invalid_type_suggestions():
+    error = rejection("SELECT Id FROM Acount")
+    assert error.code == "INVALID_TYPE"
+    assert error.suggestions[0] == "Account"
+
+
+def test_literals_keep_their_case():
+    assert validate("SELECT name FROM Account WHERE name = 'name'", default_limit=0) == "SELECT Name FROM Account WHERE Name = 'name'"
@@ -24,13 +24,30 @@ TOOLS = [
     },
     {
         "name": "query_salesforce_records",
-        "description": "Executes a SOQL query against Salesforce to retrieve records. Use for searching or fetching specific data.",
+        "description": "Executes a SOQL query against Salesforce to retrieve records. Use for searching or fetching specific data. Object and field names are checked against the org's metadata before the query runs, and queries without a LIMIT get a default one. Large result sets are paginated.",
         "parameters": {
             "type": "object",
             "properties": {
-                "query": {"type": "string", "description": "The SOQL query string to execute (e.g., 'SELECT Name, Phone FROM Account WHERE Industry = 'Technology'')."}
+                "query": {"type": "string", "description": "The SOQL query string to execute (e.g., 'SELECT Name, Phone FROM Account WHERE Industry = 'Technology'')."},
+                "max_records": {"type": "integer", "description": "Maximum number of records to return in this call (default 2000). Use next_page_token from the response to fetch more."},
+                "page_token": {"type": "string", "description": "The next_page_token returned by a previous call, to continue reading the same result set. Only set when continuing a previous query."},
+                "max_age": {"type": "integer", "description": "Maximum age in seconds of a cached result that may be returned (0 always runs the query). Only set when the user asks for fresh or live data."}
             },
-            "required": ["query"]
+            # A new query, or the continuation of one
+            "anyOf": [{"required": ["query"]}, {"required": ["page_token"]}]
+        }
+    },
+    {
+        "name": "export_salesforce_records",
+        "description": "Exports the results of a SOQL query with the Salesforce Bulk API 2.0 to a local CSV or Parquet file and returns the file path with summary statistics (record count, per-column fill rates, top values, numeric ranges, sample rows). Use for large extracts (thousands to millions of records) or when the user asks to export or download data.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "The SOQL query whose results are exported (no LIMIT needed)."},
+                "format": {"type": "string", "description": "Output file format: 'csv' (default) or 'parquet'."},
+                "export_id": {"type": "string", "description": "The export_id returned by a previous call, to check on an export that was still running. Only set when following up on an export."}
+            },
+            "required": []
         }
     }
 ]